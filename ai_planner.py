@@ -1,7 +1,7 @@
-from google import genai
 import json
 import datetime
 import streamlit as st
+from gemini import shared_client
 
 try:
     API_KEY = st.secrets["GEMINI_API_KEY"]
@@ -10,7 +10,7 @@ except:
     st.error("❌ API Key missing! Set it in .streamlit/secrets.toml or Streamlit Cloud Secrets.")
     st.stop()
 
-client = genai.Client(api_key=API_KEY)
+client = shared_client()  # deadlines + hedging, shared with CoachBrain
 
 class AIPlanner:
     def generate_schedule(self, user_request, db_goals, user_profile):
@@ -26,12 +26,10 @@ class AIPlanner:
         """
         
         try:
-            response = client.models.generate_content(
-                model='gemini-3-flash-preview',  # <--- UPDATED HERE
-                contents=prompt
-            )
+            reply = client.generate(prompt, 'gemini-3-flash-preview',  # <--- UPDATED HERE
+                                    deadline=30, label="generate_schedule")
             
-            text = response.text.replace("```json", "").replace("```", "").strip()
+            text = reply.replace("```json", "").replace("```", "").strip()
             return json.loads(text)
         except Exception as e:
             print(f"AI Planning Error: {e}")
@@ -0,0 +1,223 @@
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from storage import MEASUREMENTS
+
+# MEASUREMENTS are readings rather than daily quotas: any log counts as a "hit",
+# a day's value is its last reading, and there is no personal record.
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def _day(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _runs(hits):
+    """(longest run, run ending at the last element) of a boolean array."""
+    if not len(hits):
+        return 0, 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], hits.astype(np.int8), [0]))))
+    lengths = edges[1::2] - edges[::2]
+    longest = int(lengths.max()) if len(lengths) else 0
+    last = int(lengths[-1]) if hits[-1] else 0
+    return longest, last
+
+
+class GoalStats:
+    """Per-goal running state: daily totals plus the streak and record derived from them."""
+
+    def __init__(self, target):
+        self.target = target
+        self.totals = {}       # date -> summed value for that day (last reading for measurements)
+        self.run = 0           # length of the hit streak ending on `run_end`
+        self.run_end = None
+        self.longest = 0
+        self.record = None     # best daily total (quota goals only)
+        self.record_date = None
+
+    def hit(self, total):
+        if self.target is None or self.target <= 0:
+            return True        # logged at all
+        return total >= self.target
+
+
+class Analytics:
+    """Streaks, completion, rolling averages and PRs for the Dashboard.
+
+    Built once from the full history with vectorized pandas/NumPy, then kept
+    current by `add()` for every new log (register it with `db.add_listener`),
+    so the Dashboard never rescans the logbook. Logs for an earlier day than a
+    goal's newest, or negative corrections, rebuild just that goal.
+    """
+
+    def __init__(self, goals=None, history=None):
+        self._lock = threading.Lock()
+        self.load(goals or [], history or [])
+
+    @classmethod
+    def from_storage(cls, db):
+        return cls(db.get_goals(), db.get_raw_history())
+
+    # --- FULL BUILD ---
+    def load(self, goals, history):
+        """(Re)builds everything from goal rows and raw history rows."""
+        targets = {}
+        for g in goals:
+            target = pd.to_numeric(g.get('target'), errors='coerce')
+            targets[g['name']] = None if g['name'] in MEASUREMENTS or pd.isna(target) else float(target)
+
+        df = pd.DataFrame(history, columns=['date', 'goal_name', 'value', 'rpe'])
+        df['value'] = pd.to_numeric(df['value'], errors='coerce')
+        df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.normalize()
+        df = df.dropna(subset=['date', 'value'])
+        # A compacted summary row is already a day's total (or last reading), so it folds in like any log
+        grouped = df.groupby(['goal_name', 'date'])['value']
+        daily = grouped.sum()
+        measured = daily.index.get_level_values(0).isin(list(MEASUREMENTS))
+        if measured.any():
+            daily[measured] = grouped.last()[measured]
+
+        today = pd.Timestamp(datetime.date.today())
+        stats = {}
+        for name in set(targets) | set(daily.index.get_level_values(0)):
+            stat = stats[name] = GoalStats(targets.get(name))
+            if name not in daily.index.get_level_values(0):
+                continue
+            totals = daily.loc[name]
+            stat.totals = dict(zip(totals.index.date, totals.to_numpy().tolist()))
+            self._build_streak(stat, totals, today)
+            if stat.target is not None and name not in MEASUREMENTS:
+                best = totals.idxmax()
+                stat.record, stat.record_date = float(totals[best]), best.date()
+
+        # Goals met per day, over the goals that have a quota
+        quota = [n for n, s in stats.items() if s.target is not None and s.target > 0]
+        met = {}
+        if quota and len(daily):
+            grid = daily.unstack(0).reindex(columns=quota).fillna(0)
+            hits = (grid >= pd.Series({n: stats[n].target for n in quota})).sum(axis=1)
+            met = dict(zip(grid.index.date, hits.to_numpy().tolist()))
+
+        with self._lock:
+            self.goals = stats
+            self.quota = set(quota)
+            self.met = met
+
+    def _build_streak(self, stat, totals, today):
+        # Daily calendar from the first log to today; missing days are 0
+        days = pd.date_range(totals.index.min(), max(today, totals.index.max()))
+        full = totals.reindex(days, fill_value=0)
+        if stat.target is None or stat.target <= 0:
+            hits = full.index.isin(totals.index)
+        else:
+            hits = full.to_numpy() >= stat.target
+        stat.longest, _ = _runs(hits)
+        last_hit = np.flatnonzero(hits)
+        if len(last_hit):
+            stat.run_end = days[last_hit[-1]].date()
+            stat.run = _runs(hits[:last_hit[-1] + 1])[1]
+
+    def _rebuild_goal(self, name, stat):
+        totals = pd.Series(stat.totals, dtype=float)
+        totals.index = pd.to_datetime(totals.index)
+        stat.run, stat.run_end, stat.longest = 0, None, 0
+        if len(totals):
+            self._build_streak(stat, totals.sort_index(), pd.Timestamp(datetime.date.today()))
+            if stat.target is not None and name not in MEASUREMENTS:
+                best = totals.idxmax()
+                stat.record, stat.record_date = float(totals[best]), best.date()
+
+    # --- INCREMENTAL ---
+    def add(self, goal_name, value, date=None):
+        """Folds one new log into the stats (O(1) for the usual today-appended case)."""
+        try:
+            value = float(value)
+            day = _day(date or datetime.date.today())
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            stat = self.goals.setdefault(goal_name, GoalStats(None))
+            had = day in stat.totals
+            old = stat.totals.get(day, 0.0)
+            new = stat.totals[day] = value if goal_name in MEASUREMENTS else old + value
+            was_hit, is_hit = had and stat.hit(old), stat.hit(new)
+
+            if goal_name in self.quota and was_hit != is_hit:
+                self.met[day] = self.met.get(day, 0) + (1 if is_hit else -1)
+
+            if value < 0 or (stat.run_end is not None and day < stat.run_end):
+                self._rebuild_goal(goal_name, stat)  # Corrections and back-dated logs
+                return
+
+            if is_hit and not was_hit:
+                if stat.run_end is not None and day - stat.run_end == ONE_DAY:
+                    stat.run += 1
+                elif stat.run_end != day:
+                    stat.run = 1
+                stat.run_end = day
+                stat.longest = max(stat.longest, stat.run)
+            if stat.target is not None and goal_name not in MEASUREMENTS:
+                if stat.record is None or new > stat.record:
+                    stat.record, stat.record_date = new, day
+
+    # --- QUERIES ---
+    def streak(self, goal_name):
+        """(current, longest). A streak stays alive until a full day is missed."""
+        stat = self.goals.get(goal_name)
+        if stat is None or stat.run_end is None:
+            return 0, 0
+        alive = datetime.date.today() - stat.run_end <= ONE_DAY
+        return (stat.run if alive else 0), stat.longest
+
+    def personal_record(self, goal_name):
+        """(best daily total, date) or None."""
+        stat = self.goals.get(goal_name)
+        if stat is None or stat.record is None:
+            return None
+        return stat.record, stat.record_date
+
+    def rolling_average(self, goal_name, window=7):
+        """Mean daily total over the last `window` days (measurements: mean of the days logged)."""
+        stat = self.goals.get(goal_name)
+        if stat is None:
+            return None
+        today = datetime.date.today()
+        values = [stat.totals.get(today - k * ONE_DAY) for k in range(window)]
+        if goal_name in MEASUREMENTS:
+            logged = [v for v in values if v is not None]
+            return sum(logged) / len(logged) if logged else None
+        return sum(v or 0 for v in values) / window
+
+    def completion(self, date=None):
+        """Share of quota goals met on `date` (default today), 0-1."""
+        if not self.quota:
+            return 0.0
+        return self.met.get(_day(date or datetime.date.today()), 0) / len(self.quota)
+
+    def completion_history(self, days=30):
+        """DataFrame(date, completion) for the last `days` days, including empty ones."""
+        today = datetime.date.today()
+        dates = [today - k * ONE_DAY for k in range(days - 1, -1, -1)]
+        return pd.DataFrame({'date': pd.to_datetime(dates),
+                             'completion': [self.completion(d) for d in dates]})
+
+    def summary(self):
+        """One row per goal: streaks, record and rolling averages."""
+        rows = []
+        for name in sorted(self.goals):
+            current, longest = self.streak(name)
+            pr = self.personal_record(name)
+            rows.append({
+                'goal': name,
+                'current_streak': current,
+                'longest_streak': longest,
+                'record': pr[0] if pr else None,
+                'record_date': pr[1] if pr else None,
+                'avg_7d': self.rolling_average(name, 7),
+                'avg_30d': self.rolling_average(name, 30),
+            })
+        return pd.DataFrame(rows)
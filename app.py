@@ -1,9 +1,33 @@
 import streamlit as st
 import pandas as pd
-from coach_db import SuperCoachDB
+import datetime
+from storage import configured_backend, open_storage
 
-# Initialize Database
-db = SuperCoachDB()
+# Initialize Database (local SQLite unless the storage_backend secret says otherwise)
+@st.cache_resource(show_spinner=False)
+def get_db():
+    return open_storage(configured_backend("sqlite"))
+
+db = get_db()
+
+# Per-session copy of today's progress: loaded once, then patched in place on every
+# update so a logged rep doesn't re-query (or re-render) the whole dashboard
+def progress_snapshot(reload=False):
+    """{name: [category, target, unit, current]} in dashboard order."""
+    today = datetime.date.today().isoformat()
+    snap = st.session_state.get("progress")
+    if reload or snap is None or snap["date"] != today:
+        goals = {name: [cat, target, unit, current] for cat, name, target, unit, current in db.get_todays_progress()}
+        snap = st.session_state["progress"] = {"date": today, "goals": goals}
+    return snap["goals"]
+
+# Widget callbacks: they run before the card's fragment re-renders, so it shows the new value
+def log_progress(name, value):
+    db.update_log(name, value)
+    progress_snapshot()[name][3] = value
+
+def log_input(name):
+    log_progress(name, st.session_state[f"num_{name}"])
 
 # Page Setup
 st.set_page_config(page_title="Aditya's Super Coach", page_icon="⚡", layout="centered")
@@ -26,74 +50,53 @@ with st.sidebar:
             if new_goal:
                 if db.add_new_goal(new_goal, new_target, new_unit, new_cat):
                     st.success(f"Added {new_goal}!")
+                    progress_snapshot(reload=True)
                     st.rerun()
                 else:
                     st.error("Goal already exists!")
 
-# --- MAIN TABS ---
-tab1, tab2 = st.tabs(["🔥 Daily Grind", "🥗 Mess Auditor"])
+    if st.button("🔄 Reload Progress"):
+        # Picks up logs made from another device or main.py
+        progress_snapshot(reload=True)
+        st.session_state.pop("food", None)
 
-# === TAB 1: THE DASHBOARD ===
-with tab1:
-    # Fetch Data
-    progress_data = db.get_todays_progress()
-    
-    # Organize data by Category
-    categories = {}
-    for cat, name, target, unit, current in progress_data:
-        if cat not in categories:
-            categories[cat] = []
-        categories[cat].append((name, target, unit, current))
-    
-    # Render Dashboard
-    if not categories:
-        st.info("No goals set yet. Use the sidebar to add one!")
-    
-    for category, goals in categories.items():
-        st.subheader(f"{'🛡️' if category=='Athleticism' else '🚀'} {category}")
+# --- GOAL CARD (reruns on its own when its widgets change) ---
+@st.fragment
+def goal_card(name):
+    category, target, unit, current = progress_snapshot()[name]
+    percent = min(current / target, 1.0)
+
+    # Card Styling
+    with st.container(border=True):
+        st.write(f"**{name}**")
         
-        # Grid Layout
-        col1, col2 = st.columns(2)
+        # LOGIC: Boolean vs Numeric
+        if unit in ["bool", "session"]:
+            # It's a Checkbox Goal (Plyo, Eat Clean)
+            is_done = (current >= 1.0)
+            if is_done:
+                st.success("✅ COMPLETE")
+            else:
+                st.warning("⚠️ PENDING")
+            
+            st.button(f"Mark Done" if not is_done else "Undo", key=f"btn_{name}",
+                      on_click=log_progress, args=(name, 1.0 if not is_done else 0.0))
         
-        for i, (name, target, unit, current) in enumerate(goals):
-            percent = min(current / target, 1.0)
+        else:
+            # It's a Numeric Goal (Pullups, DSA)
+            st.progress(percent)
             
-            # Alternate columns
-            with col1 if i % 2 == 0 else col2:
-                # Card Styling
-                with st.container(border=True):
-                    st.write(f"**{name}**")
-                    
-                    # LOGIC: Boolean vs Numeric
-                    if unit in ["bool", "session"]:
-                        # It's a Checkbox Goal (Plyo, Eat Clean)
-                        is_done = (current >= 1.0)
-                        if is_done:
-                            st.success("✅ COMPLETE")
-                        else:
-                            st.warning("⚠️ PENDING")
-                        
-                        if st.button(f"Mark Done" if not is_done else "Undo", key=f"btn_{name}"):
-                            db.update_log(name, 1.0 if not is_done else 0.0)
-                            st.rerun()
-                    
-                    else:
-                        # It's a Numeric Goal (Pullups, DSA)
-                        st.progress(percent)
-                        
-                        c1, c2 = st.columns([1, 1])
-                        with c1:
-                            st.caption(f"{int(current)} / {int(target)} {unit}")
-                        with c2:
-                            # Direct Number Input
-                            new_val = st.number_input("Log", value=float(current), step=1.0, 
-                                                    key=f"num_{name}", label_visibility="collapsed")
-                            if new_val != current:
-                                db.update_log(name, new_val)
-                                st.rerun()
+            c1, c2 = st.columns([1, 1])
+            with c1:
+                st.caption(f"{int(current)} / {int(target)} {unit}")
+            with c2:
+                # Direct Number Input
+                st.number_input("Log", value=float(current), step=1.0, key=f"num_{name}",
+                                label_visibility="collapsed", on_change=log_input, args=(name,))
 
-# === TAB 2: THE MESS AUDITOR ===
-with tab2:
+# --- MESS AUDITOR (its own fragment: submitting a meal reruns only this tab) ---
+@st.fragment
+def mess_auditor():
     st.header("🥗 Mess Auditor")
     st.info("Log what the mess served vs. what you actually ate. I will audit this later.")
     
@@ -108,14 +111,16 @@ with tab2:
         submitted = st.form_submit_button("Submit Meal")
         if submitted:
             db.log_meal(meal_type, menu_desc, my_choice)
+            st.session_state.pop("food", None)
             st.success("Meal Logged!")
-            st.rerun()
 
     st.divider()
     
-    # Food History Display
+    # Food History Display (cached per session, re-read only after a new meal)
     st.subheader("Today's Logs")
-    food_logs = db.get_todays_food()
+    if "food" not in st.session_state:
+        st.session_state["food"] = db.get_todays_food()
+    food_logs = st.session_state["food"]
     
     if food_logs:
         for m_type, ate, menu in food_logs:
@@ -123,4 +128,35 @@ with tab2:
                 st.write(f"**Menu was:** {menu}")
                 st.write(f"**You ate:** {ate}")
     else:
-        st.caption("No meals logged today yet.")
\ No newline at end of file
+        st.caption("No meals logged today yet.")
+
+# --- MAIN TABS ---
+tab1, tab2 = st.tabs(["🔥 Daily Grind", "🥗 Mess Auditor"])
+
+# === TAB 1: THE DASHBOARD ===
+with tab1:
+    # Organize data by Category
+    categories = {}
+    for name, (cat, target, unit, current) in progress_snapshot().items():
+        if cat not in categories:
+            categories[cat] = []
+        categories[cat].append(name)
+    
+    # Render Dashboard
+    if not categories:
+        st.info("No goals set yet. Use the sidebar to add one!")
+    
+    for category, goals in categories.items():
+        st.subheader(f"{'🛡️' if category=='Athleticism' else '🚀'} {category}")
+        
+        # Grid Layout
+        col1, col2 = st.columns(2)
+        
+        for i, name in enumerate(goals):
+            # Alternate columns
+            with col1 if i % 2 == 0 else col2:
+                goal_card(name)
+
+# === TAB 2: THE MESS AUDITOR ===
+with tab2:
+    mess_auditor()
@@ -0,0 +1,159 @@
+"""Offline benchmark: drives main.py and app.py through scripted scenarios against fake Sheets/Gemini.
+
+    python benchmark.py                                  # 1k, 100k and 1M history rows
+    python benchmark.py --rows 1000 --latency 0.2 --json bench.json
+
+Each (row count, script) pair runs in a fresh interpreter inside a scratch directory,
+so Streamlit caches, background threads and local files (outbox, replica, snapshot)
+never leak between runs. Every step is one AppTest rerun; for each we report wall
+time plus the Sheets calls and bytes read by the rerun itself (background threads
+are counted separately) and the number of Gemini calls.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIZES = (1_000, 100_000, 1_000_000)
+
+
+# --- SCENARIOS (each step triggers exactly one rerun) ---
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def _wait_replies(at, timeout=120):
+    # Chat replies run in the job pool; the rerun after they finish renders them
+    try:
+        jobs = at.session_state["chat_jobs"]
+    except KeyError:
+        return
+    for job in jobs:
+        job.wait(timeout)
+
+
+MAIN_STEPS = [
+    ("open Commander", lambda at: at),
+    ("log weight", lambda at: (at.number_input(key="weight_sidebar").set_value(72.5),
+                               at.button(key="btn_weight_sidebar").click())),
+    ("chat: log pullups", lambda at: at.chat_input[0].set_value("did 20 pullups")),
+    ("reply lands", lambda at: _wait_replies(at)),
+    ("chat: ask Gemini", lambda at: at.chat_input[0].set_value("how is my week looking?")),
+    ("reply lands", lambda at: _wait_replies(at)),
+    ("open Dashboard", lambda at: at.radio(key="mode").set_value("📊 Dashboard")),
+    ("open History", lambda at: at.radio(key="mode").set_value("📜 History")),
+    ("History page 2", lambda at: at.number_input(key="history_page").set_value(2)),
+    ("back to Commander", lambda at: at.radio(key="mode").set_value("🤖 Commander")),
+]
+
+APP_STEPS = [
+    ("open", lambda at: at),
+    ("log Pullups", lambda at: at.number_input(key="num_Pullups").set_value(12)),
+    ("mark Plyo done", lambda at: at.button(key="btn_Plyo").click()),
+    ("log meal", lambda at: (at.text_area[1].set_value("2 eggs, dal"), _button(at, "Submit Meal").click())),
+    ("reload progress", lambda at: _button(at, "🔄 Reload Progress").click()),
+]
+
+SCENARIOS = {"main.py": MAIN_STEPS, "app.py": APP_STEPS}
+
+
+# --- ONE RUN (child process) ---
+def run_script(script, rows, latency, gemini_latency, timeout, gemini_tail=0.0):
+    """Runs one script's scenario in this process; returns a list of per-step results."""
+    sys.path.insert(0, HERE)
+    import fakes
+    from streamlit.testing.v1 import AppTest
+
+    started = time.perf_counter()
+    sheet = fakes.make_sheet(rows, latency)
+    seeded = time.perf_counter() - started
+    gemini = fakes.FakeGemini(sheet.stats, gemini_latency, gemini_tail)
+    fakes.install(sheet, gemini)
+
+    at = AppTest.from_file(os.path.join(HERE, script), default_timeout=timeout)
+    at.secrets["storage_backend"] = "sheets"
+    at.secrets["gcp_service_account"] = {"client_email": "bench@example.com", "private_key": "offline"}
+    at.secrets["GEMINI_API_KEY"] = "offline"
+
+    results = []
+    for step, prepare in SCENARIOS[script]:
+        result = {"rows": rows, "script": script, "step": step}
+        try:
+            mark = sheet.stats.mark()  # calls made while waiting on jobs count toward the step
+            prepare(at)
+            t0 = time.perf_counter()
+            at.run()
+            result["wall_s"] = round(time.perf_counter() - t0, 4)
+            result.update(sheet.stats.since(mark))
+            if at.exception:
+                result["error"] = at.exception[0].message
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        results.append(result)
+    if results:
+        results[0]["seed_s"] = round(seeded, 2)
+    return results
+
+
+# --- DRIVER ---
+def run_isolated(script, rows, args):
+    """Runs one scenario in a subprocess with a scratch working directory."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", script, "--rows", str(rows),
+           "--latency", str(args.latency), "--gemini-latency", str(args.gemini_latency),
+           "--gemini-tail", str(args.gemini_tail),
+           "--timeout", str(args.timeout)]
+    with tempfile.TemporaryDirectory(prefix="coach-bench-") as scratch:
+        proc = subprocess.run(cmd, cwd=scratch, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return [{"rows": rows, "script": script, "step": "(run)", "error": proc.stderr.strip()[-500:]}]
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def report(results):
+    print(f"{'rows':>9}  {'script':<8} {'step':<20} {'wall s':>8} {'calls':>6} {'bytes read':>12} "
+          f"{'bg calls':>8} {'bg bytes':>12} {'gemini':>6}")
+    for r in results:
+        if "wall_s" not in r:
+            print(f"{r['rows']:>9}  {r['script']:<8} {r['step']:<20} ERROR {r.get('error', '')}")
+            continue
+        print(f"{r['rows']:>9}  {r['script']:<8} {r['step']:<20} {r['wall_s']:>8.3f} {r['calls']:>6} "
+              f"{r['bytes_read']:>12,} {r['background_calls']:>8} {r['background_bytes']:>12,} {r['gemini_calls']:>6}")
+        if r.get("error"):
+            print(f"{'':>11}⚠️ {r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=list(SIZES), help="daily_entries rows per run")
+    parser.add_argument("--scripts", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every Sheets call")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="seconds added to every Gemini call")
+    parser.add_argument("--gemini-tail", type=float, default=0.0,
+                        help="share of Gemini calls that take 10x as long (exercises hedging)")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds one rerun may take")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        results = run_script(args.child, args.rows[0], args.latency, args.gemini_latency, args.timeout,
+                             args.gemini_tail)
+        print(json.dumps(results))
+        return
+
+    results = []
+    for rows in args.rows:
+        for script in args.scripts:
+            results.extend(run_isolated(script, rows, args))
+    report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,40 @@
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import streamlit as st
 import time
 import datetime
+import json
 import pytz # <--- NEW: For India Time
-import re
+from parser import SmartParser
+from gemini import GeminiClient, configure_genai, shared_client
+
+# Resolved model name survives restarts here; re-discovered after the TTL
+MODEL_CACHE_FILE = ".gemini_model.json"
+MODEL_CACHE_TTL = 24 * 3600
+
+# Share of clauses the parser must understand before we answer without the LLM
+FAST_PATH_CONFIDENCE = 1.0
 
 class CoachBrain:
-    def __init__(self, db):
+    def __init__(self, db, model_name=None):
         self.db = db
         try:
             api_key = st.secrets["GEMINI_API_KEY"]
-            genai.configure(api_key=api_key)
+            configure_genai(api_key)
+            self.client = shared_client()  # deadlines + hedging, shared with the planner/memory
         except Exception as e:
             st.error(f"⚠️ API Key Error: {e}")
+            self.client = GeminiClient()
+
+        # Explicit override (argument or GEMINI_MODEL secret) skips discovery entirely
+        try:
+            self.model_override = model_name or st.secrets.get("GEMINI_MODEL")
+        except Exception:
+            self.model_override = model_name
+        self._model = None
+        self._model_resolved_at = 0.0
+        self._parser = SmartParser()
+        self._parser_synonyms = {}
 
     def get_ist_time(self):
         """Returns current time in India."""
@@ -20,8 +42,34 @@ class CoachBrain:
         ist_now = utc_now.astimezone(pytz.timezone('Asia/Kolkata'))
         return ist_now
 
-    def get_working_model(self):
-        # (Keep your existing auto-discovery code from the previous step)
+    def get_working_model(self, refresh=False):
+        """Returns the model to use, from memory/disk cache unless `refresh` or expired."""
+        if self.model_override:
+            return self.model_override
+        if not refresh and self._model and time.time() - self._model_resolved_at < MODEL_CACHE_TTL:
+            return self._model
+        if not refresh:
+            try:
+                with open(MODEL_CACHE_FILE) as f:
+                    cached = json.load(f)
+                if cached.get("model") and time.time() - cached.get("resolved_at", 0) < MODEL_CACHE_TTL:
+                    self._model, self._model_resolved_at = cached["model"], cached["resolved_at"]
+                    return self._model
+            except (OSError, ValueError):
+                pass
+
+        model_name = self._discover_model()
+        if model_name:
+            self._model, self._model_resolved_at = model_name, time.time()
+            try:
+                with open(MODEL_CACHE_FILE, "w") as f:
+                    json.dump({"model": model_name, "resolved_at": self._model_resolved_at}, f)
+            except OSError:
+                pass  # Read-only disk: keep the in-memory copy
+        return model_name
+
+    def _discover_model(self):
+        # One list_models() round trip; only runs when the cache is cold or stale
         try:
             available_models = []
             for m in genai.list_models():
@@ -36,29 +84,85 @@ class CoachBrain:
             return None
         except: return None
 
-    def process_input(self, user_text):
+    def generate(self, prompt):
+        """Reply text from the cached model, re-resolving once if it has been retired."""
+        model_name = self.get_working_model()
+        try:
+            return self.client.generate(prompt, model_name)
+        except google_exceptions.NotFound:
+            if self.model_override:
+                raise
+            return self.client.generate(prompt, self.get_working_model(refresh=True))
+
+    def stream(self, prompt):
+        """Yields the reply text chunk by chunk as Gemini produces it."""
+        for attempt in range(2):
+            model_name = self.get_working_model(refresh=attempt > 0)
+            try:
+                yield from self.client.stream(prompt, model_name)
+                return
+            except google_exceptions.NotFound:
+                if attempt or self.model_override:
+                    raise
+
+    # --- INTENT ROUTER ---
+    def route(self, user_text):
+        """Parses logging commands, rebuilding the parser only when the goals sheet changed."""
+        try:
+            synonyms = self.db.get_goal_synonyms()
+        except Exception:
+            synonyms = self._parser_synonyms
+        if synonyms != self._parser_synonyms:
+            self._parser = SmartParser(synonyms)
+            self._parser_synonyms = synonyms
+        return self._parser.parse(user_text)
+
+    def execute(self, commands):
+        """Runs parsed commands against the DB; returns a label per logged item."""
+        logged = []
+        with self.db.batch():
+            for cmd in commands:
+                if cmd["action"] == "log_metric" and cmd["goal"]:
+                    self.db.log_metric(cmd["goal"], cmd["value"])
+                    unit = "kg" if cmd["goal"] == "Weight" else f" {cmd['goal']}"
+                    logged.append(f"{cmd['value']:g}{unit}")
+                elif cmd["action"] == "log_food":
+                    self.db.log_food(cmd["item"])
+                    logged.append(f"🍽️ {cmd['item']}")
+        return logged
+
+    def confirmation(self, logged):
+        lines = ["✅ Logged " + ", ".join(f"**{item}**" for item in logged)]
+        try:
+            for name, target, unit, value, rpe in self.db.get_progress():
+                if any(item.endswith(f" {name}") for item in logged):
+                    lines.append(f"- {name}: {value:g}/{target} {unit} today")
+        except Exception:
+            pass  # Stats are a nice-to-have here
+        return "\n".join(lines)
+
+    def process_input(self, user_text, stream=False):
+        """Returns the reply text, or with `stream=True` an iterator of text chunks."""
+        chunks = self._reply(user_text)
+        return chunks if stream else "".join(chunks)
+
+    def _reply(self, user_text):
         system_update = ""
         text_lower = user_text.lower()
         
-        # --- 1. LOGGING (Keep existing) ---
-        if any(w in text_lower for w in ["pull up", "dip", "push up", "workout"]):
-            numbers = re.findall(r'\d+', user_text)
-            if numbers:
-                val = float(numbers[0])
-                metric = "Pullups" if "pull" in text_lower else "Dips" if "dip" in text_lower else "Workout"
-                self.db.log_metric(metric, val)
-                system_update = f"[Logged {val} {metric}]"
-
-        elif "weigh" in text_lower or "kg" in text_lower:
-            numbers = re.findall(r'\d+\.?\d*', user_text)
-            if numbers:
-                val = float(numbers[0])
-                self.db.log_metric("Weight", val)
-                system_update = f"[Logged {val}kg]"
+        # --- 1. LOGGING (local intent router, no LLM) ---
+        # Only a fully understood message is written; anything less goes to the LLM unsaved
+        planning = "plan" in text_lower or "schedule" in text_lower
+        result = None if planning else self.route(user_text)
+        if result and result.commands and result.confidence >= FAST_PATH_CONFIDENCE:
+            logged = self.execute(result.commands)
+            if logged:
+                yield self.confirmation(logged)
+                return
 
         # --- 2. PLANNING AGENT (NEW!) ---
         # If user asks to "plan", we generate AND save.
-        elif "plan" in text_lower or "schedule" in text_lower:
+        if planning:
             
             # A. Get the AI to generate a strict format
             ist_now = self.get_ist_time().strftime("%H:%M")
@@ -77,12 +181,11 @@ class CoachBrain:
             Do not add conversational filler. Just the list.
             """
             
-            model_name = self.get_working_model()
-            if not model_name: return "⚠️ API Error: No model found."
+            if not self.get_working_model():
+                yield "⚠️ API Error: No model found."
+                return
             
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt)
-            raw_plan = response.text
+            raw_plan = self.generate(prompt)
             
             # B. Parse the AI's output
             new_schedule = []
@@ -98,12 +201,18 @@ class CoachBrain:
             # C. Save to Database
             if new_schedule:
                 self.db.create_schedule(new_schedule)
-                return f"✅ **Plan Saved to Database!** check the sidebar.\n\n" + raw_plan
+                yield f"✅ **Plan Saved to Database!** check the sidebar.\n\n" + raw_plan
             else:
-                return "⚠️ I tried to plan, but I couldn't format it correctly. Try again?"
+                yield "⚠️ I tried to plan, but I couldn't format it correctly. Try again?"
+            return
 
         # --- 3. STANDARD CHAT (Fallback) ---
-        # ... (Rest of your code remains the same)
+        if result.commands:
+            # Low-confidence parse: let the coach see it without writing it to the sheet
+            parsed = ", ".join(f"{c['goal']} {c['value']:g}" if c["action"] == "log_metric" else f"food: {c['item']}"
+                               for c in result.commands if c.get("goal") or c["action"] == "log_food")
+            if parsed:
+                system_update = f"[Might be a log, NOT saved: {parsed}. Ask before assuming it was logged.]"
         try:
             context = self.db.get_progress()
         except: context = "No data."
@@ -117,8 +226,4 @@ class CoachBrain:
         USER SAID: "{user_text}"
         """
         
-        # (Use your existing fallback logic here for generate_content)
-        model_name = self.get_working_model()
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        return response.text
\ No newline at end of file
+        yield from self.stream(prompt)
\ No newline at end of file
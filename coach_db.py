@@ -1,34 +1,149 @@
 import sqlite3
 import datetime
+import threading
+from contextlib import contextmanager
+from storage import CoachStorage, TABLES
+
+class SuperCoachDB(CoachStorage):
+    # Applied to every pooled connection
+    PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",  # Safe with WAL: fsyncs at checkpoints, not on every commit
+        "PRAGMA cache_size=-16000",   # 16 MB page cache per connection
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=5000",
+    )
+    STATEMENT_CACHE = 256  # Prepared statements kept per connection (sqlite3 reuses them by SQL text)
 
-class SuperCoachDB:
     def __init__(self, db_name="coach_memory.db"):
-        # check_same_thread=False is needed for Streamlit
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)
-        self.cursor = self.conn.cursor()
+        self.db_name = db_name
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._owners = {}  # connection -> thread currently holding it
+        # One writer at a time; with WAL, readers never wait on it
+        self._write_lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Persistent: stored in the db file
         self._init_db()
 
+    # --- CONNECTIONS ---
+    @property
+    def conn(self):
+        """This thread's connection, checked out of the pool on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._checkout()
+        return conn
+
+    def _checkout(self):
+        me = threading.current_thread()
+        with self._pool_lock:
+            # Streamlit runs every rerun on a fresh thread: hand over connections of finished ones
+            for conn, owner in self._owners.items():
+                if not owner.is_alive():
+                    if conn.in_transaction:
+                        conn.rollback()
+                    self._owners[conn] = me
+                    return conn
+            conn = sqlite3.connect(self.db_name, check_same_thread=False, timeout=5,
+                                   cached_statements=self.STATEMENT_CACHE)
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._owners[conn] = me
+            return conn
+
+    def close(self):
+        with self._pool_lock:
+            for conn in self._owners:
+                conn.close()
+            self._owners.clear()
+        self._local = threading.local()
+
+    @contextmanager
+    def batch(self, commit_every=None):
+        """Serializes writes and groups them into one transaction, committed on exit.
+
+        Every write goes through here; nested calls join the outer batch. For bulk
+        loads, `commit_every=N` commits after every N nested writes instead of
+        holding one huge transaction open. Rolls back if the block raises.
+        """
+        with self._write_lock:
+            conn = self.conn
+            local = self._local
+            outer = not getattr(local, "depth", 0)
+            if outer:
+                local.depth, local.pending, local.commit_every = 0, 0, commit_every
+            local.depth += 1
+            try:
+                yield conn
+            except BaseException:
+                if outer:
+                    conn.rollback()
+                raise
+            else:
+                if outer:
+                    conn.commit()
+                else:
+                    local.pending += 1
+                    if local.commit_every and local.pending >= local.commit_every:
+                        conn.commit()
+                        local.pending = 0
+            finally:
+                local.depth -= 1
+
+    # --- SCHEMA MIGRATIONS ---
+    # PRAGMA user_version counts the steps in MIGRATIONS already applied, so existing
+    # coach_memory.db files are upgraded in place. Only ever append new steps.
     def _init_db(self):
+        while True:
+            with self.batch() as conn:
+                conn.execute("BEGIN IMMEDIATE")  # Another process may be migrating the same file
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(self.MIGRATIONS):
+                    return
+                self.MIGRATIONS[version](self, conn)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+
+    def _create_tables(self, conn):
+        # v1: the original schema (idempotent, so pre-versioning files pass through it too)
         # 1. GOALS TABLE (With Category)
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS goals
+        conn.execute('''CREATE TABLE IF NOT EXISTS goals
                              (name TEXT PRIMARY KEY, target REAL, unit TEXT, category TEXT)''')
         
         # 2. DAILY LOGS TABLE
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS daily_entries
+        conn.execute('''CREATE TABLE IF NOT EXISTS daily_entries
                              (date TEXT, goal_name TEXT, value REAL, 
                               PRIMARY KEY (date, goal_name))''')
 
         # 3. FOOD LOGS TABLE (Mess Auditor)
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS food_logs
+        conn.execute('''CREATE TABLE IF NOT EXISTS food_logs
                              (id INTEGER PRIMARY KEY AUTOINCREMENT, 
                               date TEXT, 
                               meal_type TEXT, 
                               menu_description TEXT,
                               what_i_ate TEXT)''')
         
+        # 4. SHEETS REPLICA TABLES (raw rows keyed by their Google Sheets row number)
+        conn.execute('''CREATE TABLE IF NOT EXISTS entry_log
+                             (row INTEGER PRIMARY KEY, date TEXT, goal_name TEXT,
+                              value REAL, rpe TEXT)''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entry_log_goal ON entry_log (goal_name, date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entry_log_date ON entry_log (date)")
+        conn.execute('''CREATE TABLE IF NOT EXISTS chat_history
+                             (row INTEGER PRIMARY KEY, timestamp TEXT, sender TEXT, message TEXT)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS schedule
+                             (row INTEGER PRIMARY KEY, date TEXT, time_slot TEXT,
+                              task TEXT, status TEXT)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS replica_state
+                             (worksheet TEXT PRIMARY KEY, rows INTEGER, anchor TEXT, synced_at REAL)''')
+
+        # food_logs rows pulled from Sheets carry a time and their sheet row
+        food_cols = [r[1] for r in conn.execute("PRAGMA table_info(food_logs)")]
+        if "time" not in food_cols:
+            conn.execute("ALTER TABLE food_logs ADD COLUMN time TEXT")
+        if "sheet_row" not in food_cols:
+            conn.execute("ALTER TABLE food_logs ADD COLUMN sheet_row INTEGER")
+
         # SEED DEFAULT GOALS (Only if table is empty)
-        self.cursor.execute("SELECT count(*) FROM goals")
-        if self.cursor.fetchone()[0] == 0:
+        if conn.execute("SELECT count(*) FROM goals").fetchone()[0] == 0:
             defaults = [
                 # ATHLETICISM
                 ("Pullups", 15, "reps", "Athleticism"),
@@ -41,8 +156,99 @@ class SuperCoachDB:
                 ("Job Apps", 5, "apps", "Career"),
                 ("Deep Work", 4, "hours", "Career")
             ]
-            self.cursor.executemany("INSERT INTO goals VALUES (?,?,?,?)", defaults)
-            self.conn.commit()
+            conn.executemany("INSERT INTO goals VALUES (?,?,?,?)", defaults)
+
+    def _add_indexes(self, conn):
+        # v2: today's food lookups and per-goal date ranges
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_food_logs_date ON food_logs (date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_entries_goal ON daily_entries (goal_name, date)")
+
+    def _add_rollups(self, conn):
+        # v3: materialized rollups, kept current by refresh_rollups()
+        conn.execute('''CREATE TABLE IF NOT EXISTS day_rollups
+                        (date TEXT PRIMARY KEY, goals_met INTEGER, goals_total INTEGER,
+                         ratio REAL, entries INTEGER)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS goal_rollups
+                        (goal_name TEXT, period TEXT, start TEXT, total REAL, days INTEGER,
+                         PRIMARY KEY (goal_name, period, start))''')
+
+    def _add_entry_counts(self, conn):
+        # v4: compacted Sheets summary rows stand for several log entries (see CoachDB.compact)
+        conn.execute("ALTER TABLE entry_log ADD COLUMN entries INTEGER DEFAULT 1")
+        # Backfill here rather than in v3: refresh_rollups() reads entry_log.entries
+        self.refresh_rollups()
+
+    def _backfill_entry_log(self, conn):
+        # v5: files from before entry_log only have daily totals; give each one a log row
+        # so history, exports and entry counts see them
+        if conn.execute("SELECT 1 FROM entry_log LIMIT 1").fetchone():
+            return
+        conn.execute('''INSERT INTO entry_log (row, date, goal_name, value, rpe, entries)
+                        SELECT 1 + ROW_NUMBER() OVER (ORDER BY date, goal_name), date, goal_name, value, '', 1
+                        FROM daily_entries''')
+        self.refresh_rollups()
+
+    MIGRATIONS = (_create_tables, _add_indexes, _add_rollups, _add_entry_counts, _backfill_entry_log)
+
+    # --- ROLLUPS ---
+    # Completion counts every goal with a positive target except Weight (a measurement,
+    # not a quota), against the targets in force when the day was last written.
+    _DAY_ROLLUP = '''
+        INSERT OR REPLACE INTO day_rollups (date, goals_met, goals_total, ratio, entries)
+        SELECT :date, COALESCE(SUM(COALESCE(d.value, 0) >= g.target), 0), COUNT(*),
+               COALESCE(AVG(COALESCE(d.value, 0) >= g.target), 0),
+               (SELECT COALESCE(SUM(entries), 0) FROM entry_log WHERE date = :date)
+        FROM goals g
+        LEFT JOIN daily_entries d ON d.goal_name = g.name AND d.date = :date
+        WHERE g.name != 'Weight' AND g.target > 0
+    '''
+    _GOAL_ROLLUP = '''
+        INSERT OR REPLACE INTO goal_rollups (goal_name, period, start, total, days)
+        SELECT :goal, :period, :start, COALESCE(SUM(value), 0), COUNT(*)
+        FROM daily_entries WHERE goal_name = :goal AND date BETWEEN :start AND :end
+    '''
+
+    def refresh_rollups(self, keys=None):
+        """Recomputes the rollups covering `keys` [(date, goal_name), ...]; all of them if None.
+
+        Each touched day and goal week/month is re-read from daily_entries through
+        its index, so a single write costs a handful of row lookups.
+        """
+        with self.batch() as conn:
+            if keys is None:
+                conn.execute("DELETE FROM day_rollups")
+                conn.execute("DELETE FROM goal_rollups")
+                keys = conn.execute(
+                    "SELECT date, goal_name FROM daily_entries UNION SELECT date, goal_name FROM entry_log")
+            days, periods = set(), set()
+            for date, goal_name in keys:
+                try:
+                    day = datetime.date.fromisoformat(str(date))
+                except ValueError:
+                    continue  # Hand-typed sheet rows ("TEST_DATE")
+                days.add(day.isoformat())
+                week = day - datetime.timedelta(days=day.weekday())
+                month = day.replace(day=1)
+                month_end = (month + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+                periods.add((goal_name, "week", week.isoformat(), (week + datetime.timedelta(days=6)).isoformat()))
+                periods.add((goal_name, "month", month.isoformat(), month_end.isoformat()))
+            conn.executemany(self._DAY_ROLLUP, [{"date": d} for d in days])
+            conn.executemany(self._GOAL_ROLLUP, [
+                {"goal": g, "period": p, "start": start, "end": end} for g, p, start, end in periods
+            ])
+
+    def get_completion_history(self, days=None):
+        """[(date, ratio of goals met), ...], oldest first; only the last `days` days if given."""
+        since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat() if days else ""
+        return self.conn.execute("SELECT date, ratio FROM day_rollups WHERE date >= ? ORDER BY date",
+                                 (since,)).fetchall()
+
+    def get_goal_totals(self, goal_name, period="week"):
+        """[(period_start, total, days_logged), ...] for period 'week' or 'month', oldest first."""
+        rows = self.conn.execute(
+            "SELECT start, total, days FROM goal_rollups WHERE goal_name = ? AND period = ? ORDER BY start",
+            (goal_name, period))
+        return rows.fetchall()
 
     # --- GOAL TRACKING METHODS ---
     def get_todays_progress(self):
@@ -54,19 +260,70 @@ class SuperCoachDB:
             LEFT JOIN daily_entries d ON g.name = d.goal_name AND d.date = ?
             ORDER BY g.category DESC, g.name ASC
         '''
-        self.cursor.execute(query, (today,))
-        return self.cursor.fetchall()
+        return self.conn.execute(query, (today,)).fetchall()
 
     def update_log(self, goal_name, value):
         today = datetime.date.today().isoformat()
-        self.cursor.execute("INSERT OR REPLACE INTO daily_entries VALUES (?,?,?)", 
-                            (today, goal_name, value))
-        self.conn.commit()
+        # Record the change in the raw log too, so history sums match the daily total
+        with self.batch() as conn:
+            delta = value - self.get_day_total(today, goal_name)
+            if delta:
+                conn.execute("INSERT INTO entry_log (row, date, goal_name, value, rpe) VALUES (?,?,?,?,?)",
+                             (self._next_row("entry_log"), today, goal_name, delta, ""))
+            conn.execute("INSERT OR REPLACE INTO daily_entries VALUES (?,?,?)", 
+                         (today, goal_name, value))
+            self.refresh_rollups([(today, goal_name)])
+        if delta:
+            self._notify(goal_name, delta, today)
+
+    def log_metric(self, name, value, rpe=None):
+        today = datetime.date.today().isoformat()
+        with self.batch() as conn:
+            conn.execute("INSERT INTO entry_log (row, date, goal_name, value, rpe) VALUES (?,?,?,?,?)",
+                         (self._next_row("entry_log"), today, name, value, rpe if rpe else ""))
+            conn.execute('''INSERT INTO daily_entries VALUES (?,?,?)
+                            ON CONFLICT(date, goal_name) DO UPDATE SET value = value + excluded.value''',
+                         (today, name, value))
+            self.refresh_rollups([(today, name)])
+        self._notify(name, value, today)
+
+    def _next_row(self, table):
+        # Row ids follow sheet numbering (first data row is 2), see storage.CoachStorage
+        return self.conn.execute(f"SELECT COALESCE(MAX(row), 1) + 1 FROM {table}").fetchone()[0]
+
+    def get_goals(self):
+        rows = self.conn.execute("SELECT name, target, unit, category FROM goals ORDER BY rowid")
+        return [{"name": n, "target": t, "unit": u, "category": c} for n, t, u, c in rows]
+
+    def get_day_total(self, date, goal_name):
+        row = self.conn.execute("SELECT value FROM daily_entries WHERE date = ? AND goal_name = ?",
+                                (date, goal_name)).fetchone()
+        return row[0] if row else 0
+
+    def get_progress(self):
+        today = datetime.date.today().isoformat()
+        query = '''
+            SELECT g.name, g.target, g.unit, COALESCE(d.value, 0),
+                   (SELECT e.rpe FROM entry_log e
+                    WHERE e.date = ? AND e.goal_name = g.name AND e.rpe != ''
+                    ORDER BY e.row DESC LIMIT 1)
+            FROM goals g
+            LEFT JOIN daily_entries d ON g.name = d.goal_name AND d.date = ?
+            ORDER BY g.rowid
+        '''
+        return self.conn.execute(query, (today, today)).fetchall()
+
+    def is_weight_logged_today(self):
+        today = datetime.date.today().isoformat()
+        row = self.conn.execute("SELECT 1 FROM daily_entries WHERE date = ? AND goal_name = 'Weight'",
+                                (today,)).fetchone()
+        return row is not None
 
     def add_new_goal(self, name, target, unit, category):
         try:
-            self.cursor.execute("INSERT INTO goals VALUES (?,?,?,?)", (name, target, unit, category))
-            self.conn.commit()
+            with self.batch() as conn:
+                conn.execute("INSERT INTO goals VALUES (?,?,?,?)", (name, target, unit, category))
+                self.refresh_rollups([(datetime.date.today().isoformat(), name)])
             return True
         except sqlite3.IntegrityError:
             return False
@@ -74,11 +331,164 @@ class SuperCoachDB:
     # --- MESS AUDITOR METHODS ---
     def log_meal(self, meal_type, menu, ate):
         today = datetime.date.today().isoformat()
-        self.cursor.execute("INSERT INTO food_logs (date, meal_type, menu_description, what_i_ate) VALUES (?,?,?,?)", 
-                            (today, meal_type, menu, ate))
-        self.conn.commit()
+        now = datetime.datetime.now().strftime("%H:%M")
+        with self.batch() as conn:
+            conn.execute("INSERT INTO food_logs (date, meal_type, menu_description, what_i_ate, time) VALUES (?,?,?,?,?)", 
+                         (today, meal_type, menu, ate, now))
+
+    def log_food(self, content):
+        # Quick log from chat: no menu, generic meal type
+        self.log_meal("Snack/Meal", "", content)
 
     def get_todays_food(self):
         today = datetime.date.today().isoformat()
-        self.cursor.execute("SELECT meal_type, what_i_ate, menu_description FROM food_logs WHERE date = ?", (today,))
-        return self.cursor.fetchall()
\ No newline at end of file
+        rows = self.conn.execute(
+            "SELECT meal_type, what_i_ate, menu_description FROM food_logs WHERE date = ?", (today,))
+        return rows.fetchall()
+
+    # --- REPLICA QUERIES (Sheets history mirrored locally, see replica.py) ---
+    def get_metric_history(self, goal_name):
+        rows = self.conn.execute(
+            "SELECT date, value FROM entry_log WHERE goal_name = ? AND value IS NOT NULL ORDER BY row",
+            (goal_name,))
+        return rows.fetchall()
+
+    def get_consistency_data(self):
+        rows = self.conn.execute("SELECT date, entries FROM day_rollups WHERE entries > 0 ORDER BY date")
+        return rows.fetchall()
+
+    def get_all_goal_names(self):
+        return [r[0] for r in self.conn.execute("SELECT name FROM goals ORDER BY rowid")]
+
+    def get_logged_goal_names(self):
+        # Walks idx_entry_log_goal, one step per distinct goal rather than per row
+        rows = self.conn.execute("SELECT DISTINCT goal_name FROM entry_log WHERE goal_name != '' ORDER BY goal_name")
+        return [r[0] for r in rows]
+
+    def get_raw_history(self):
+        rows = self.conn.execute("SELECT date, goal_name, value, rpe FROM entry_log ORDER BY row")
+        return [{"date": d, "goal_name": g, "value": v, "rpe": r} for d, g, v, r in rows]
+
+    def get_history_page(self, goals=None, start=None, end=None, page=0, page_size=50):
+        # Filters, sort and paging all run in SQLite; only the visible page is fetched
+        where, args = [], []
+        if goals:
+            where.append(f"goal_name IN ({','.join('?' * len(goals))})")
+            args.extend(goals)
+        if start:
+            where.append("date >= ?")
+            args.append(str(start))
+        if end:
+            where.append("date <= ?")
+            args.append(str(end))
+        clause = " WHERE " + " AND ".join(where) if where else ""
+        total = self.conn.execute(f"SELECT COUNT(*) FROM entry_log{clause}", args).fetchone()[0]
+        rows = self.conn.execute(
+            f"SELECT date, goal_name, value, rpe FROM entry_log{clause} ORDER BY date DESC, row DESC LIMIT ? OFFSET ?",
+            (*args, page_size, page * page_size))
+        return [{"date": d, "goal_name": g, "value": v, "rpe": r} for d, g, v, r in rows], total
+
+    # --- CHAT & SCHEDULE ---
+    def log_chat(self, sender, message):
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.batch() as conn:
+            conn.execute("INSERT INTO chat_history VALUES (?,?,?,?)",
+                         (self._next_row("chat_history"), now, sender, message))
+
+    def get_chat_page(self, before_row=None, limit=20):
+        rows = self.conn.execute(
+            "SELECT row, sender, message FROM chat_history WHERE row < ? ORDER BY row DESC LIMIT ?",
+            (before_row or 2 ** 62, limit)).fetchall()
+        rows.reverse()
+        cursor = rows[0][0] if rows else 2
+        return [(sender, message) for _, sender, message in rows], cursor
+
+    def create_schedule(self, tasks):
+        import pytz
+        today = datetime.datetime.now(pytz.timezone('Asia/Kolkata')).date().isoformat()
+        with self.batch() as conn:
+            first = self._next_row("schedule")
+            conn.executemany("INSERT INTO schedule VALUES (?,?,?,?,?)", [
+                (first + i, today, time_slot, task, "PENDING") for i, (time_slot, task) in enumerate(tasks)
+            ])
+
+    def get_full_schedule(self):
+        today = datetime.date.today().isoformat()
+        rows = self.conn.execute(
+            "SELECT time_slot, task, status FROM schedule WHERE date = ? ORDER BY time_slot", (today,))
+        return rows.fetchall()
+
+    def mark_mission_done(self, row_id):
+        with self.batch() as conn:
+            conn.execute("UPDATE schedule SET status = 'DONE' WHERE row = ?", (row_id,))
+
+    # --- BULK COPY ---
+    # Canonical TABLES layout <-> local tables
+    _EXPORT = {
+        "goals": "SELECT name, target, unit, category FROM goals ORDER BY rowid",
+        # Raw log rows, plus a balancing row wherever a daily total was set without one
+        "daily_entries": '''
+            SELECT date, goal_name, value, rpe, entries FROM (
+                SELECT e.date, e.goal_name, e.value, e.rpe,
+                       CASE WHEN e.entries > 1 THEN e.entries ELSE '' END AS entries, e.row AS k FROM entry_log e
+                UNION ALL
+                SELECT d.date, d.goal_name, d.value - COALESCE(SUM(e.value), 0), '', '', 0 FROM daily_entries d
+                LEFT JOIN entry_log e ON e.date = d.date AND e.goal_name = d.goal_name
+                GROUP BY d.date, d.goal_name
+                HAVING d.value - COALESCE(SUM(e.value), 0) != 0
+            ) ORDER BY date, k''',
+        "food_logs": '''
+            SELECT date, COALESCE(time, ''),
+                   CASE WHEN meal_type = 'Snack/Meal' OR sheet_row IS NOT NULL THEN what_i_ate
+                        WHEN COALESCE(menu_description, '') = '' THEN meal_type || ': ' || what_i_ate
+                        ELSE meal_type || ': ' || what_i_ate || ' (menu: ' || menu_description || ')' END
+            FROM food_logs ORDER BY id''',
+        "chat_history": "SELECT timestamp, sender, message FROM chat_history ORDER BY row",
+        "schedule": "SELECT date, time_slot, task, status FROM schedule ORDER BY row",
+    }
+
+    def count_rows(self, table):
+        return self.conn.execute(f"SELECT COUNT(*) FROM ({self._EXPORT[table]})").fetchone()[0]
+
+    def iter_rows(self, table, chunk_size=500, start=0):
+        cursor = self.conn.execute(self._EXPORT[table] + " LIMIT -1 OFFSET ?", (start,))
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                return
+            yield [list(r) for r in chunk]
+
+    def bulk_append(self, table, rows):
+        """Inserts one chunk in a single transaction (or as part of an open batch())."""
+        with self.batch() as conn:
+            if table == "goals":
+                conn.executemany('''INSERT INTO goals VALUES (?,?,?,?) ON CONFLICT(name) DO UPDATE
+                                         SET target = excluded.target, unit = excluded.unit''',
+                                      [(n, t, u, c or "General") for n, t, u, c in rows])
+            elif table == "daily_entries":
+                first = self._next_row("entry_log")
+                # Compacted summary rows carry how many entries they stand for
+                conn.executemany("INSERT INTO entry_log VALUES (?,?,?,?,?,?)", [
+                    (first + i, str(d), g, v if v != "" else None, str(r), int(n[0]) if n and n[0] != "" else 1)
+                    for i, (d, g, v, r, *n) in enumerate(rows)
+                ])
+                totals = {}
+                for d, g, v, *_ in rows:
+                    try:
+                        totals[(str(d), g)] = totals.get((str(d), g), 0) + (float(v) if v != "" else 0)
+                    except (TypeError, ValueError):
+                        continue
+                conn.executemany('''INSERT INTO daily_entries VALUES (?,?,?)
+                                         ON CONFLICT(date, goal_name) DO UPDATE SET value = value + excluded.value''',
+                                      [(d, g, v) for (d, g), v in totals.items()])
+                self.refresh_rollups(totals)
+            elif table == "food_logs":
+                conn.executemany('''INSERT INTO food_logs (date, meal_type, menu_description, what_i_ate, time)
+                                         VALUES (?,?,?,?,?)''',
+                                      [(str(d), "Snack/Meal", "", c, str(t)) for d, t, c in rows])
+            else:
+                first = self._next_row(table)
+                width = len(TABLES[table])
+                marks = ",".join("?" * (width + 1))
+                conn.executemany(f"INSERT INTO {table} VALUES ({marks})",
+                                      [(first + i, *[str(v) for v in r]) for i, r in enumerate(rows)])
@@ -2,34 +2,684 @@ import streamlit as st
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import requests
 import pandas as pd
+from gspread.utils import numericise_all, rowcol_to_a1
+from outbox import Outbox
+from scheduler import SheetsScheduler
+import tracing
+from storage import CoachStorage, SidebarSnapshot, MEASUREMENTS, TABLES, header_columns
 
-class CoachDB:
-    def __init__(self):
-        # Authenticate using Streamlit Secrets
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        
-        # We create a credentials dict from the secrets
-        creds_dict = dict(st.secrets["gcp_service_account"])
-        # Fix private key formatting if necessary
-        creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        self.client = gspread.authorize(creds)
-        
-        # Open the Sheet
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+SHEET_NAME = "super_coach_db"
+
+# Tabs we only ever append to; these are refreshed by fetching new rows only
+APPEND_ONLY = ("daily_entries", "food_logs", "chat_history")
+
+# Tabs compact() trims, and the per-month tabs their old rows move to
+COMPACTED = ("daily_entries", "chat_history")
+ARCHIVE_TITLE = "archive_{name}_{month}"  # e.g. archive_daily_entries_2025_01
+
+# Calls that spend the write quota; everything else is a read
+WRITE_CALLS = ("append_rows", "update_cell", "batch_update", "add_worksheet")
+
+
+class SheetsConnection:
+    """One authorized gspread client + worksheet handles, shared by every session."""
+
+    # Ping the sheet before the first call after this many idle seconds
+    HEALTH_CHECK_INTERVAL = 300
+
+    def __init__(self, creds_dict, scheduler=None):
+        self._creds_dict = creds_dict
+        self._lock = threading.RLock()
+        self._last_ok = 0.0
+        # Quota budget, retries and read coalescing for every request (see run)
+        self.scheduler = scheduler or SheetsScheduler()
+        self.connect()
+
+    def connect(self):
+        """(Re)runs the OAuth handshake and resolves every tab in one metadata call."""
+        with self._lock:
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(self._creds_dict, SCOPE)
+            self.client = gspread.authorize(creds)
+            self.sheet = self.client.open(SHEET_NAME)
+            # One fetch_sheet_metadata call instead of five worksheet(...) lookups
+            self.worksheets = {ws.title: ws for ws in self.sheet.worksheets()}
+            self._last_ok = time.monotonic()
+
+    def worksheet(self, name):
         try:
-            self.sheet = self.client.open("super_coach_db")
-        except:
+            return self.worksheets[name]
+        except KeyError:
+            raise gspread.WorksheetNotFound(name)
+
+    def is_healthy(self):
+        try:
+            self.sheet.fetch_sheet_metadata()
+            self._last_ok = time.monotonic()
+            return True
+        except Exception:
+            return False
+
+    def run(self, fn, call=None, worksheet=None, args=()):
+        """Runs fn() through the scheduler, reconnecting once on expired auth or a dropped socket.
+
+        `call` and `worksheet` label the request's trace span and tell reads from
+        writes. Reads of the same (call, worksheet, args) already in flight are
+        shared, so callers must not mutate what a read returns.
+        """
+        kind = "write" if call in WRITE_CALLS else "read"
+        key = (call, worksheet, tuple(args)) if call else None
+        with tracing.span("sheets", call or "call", worksheet) as span:
+            result = self.scheduler.run(lambda: self._attempt(fn, span), kind, key, span)
+            span.measure(result)
+            return result
+
+    def _attempt(self, fn, span):
+        if time.monotonic() - self._last_ok > self.HEALTH_CHECK_INTERVAL and not self.is_healthy():
+            self.connect()
+        try:
+            result = fn()
+        except gspread.exceptions.APIError as e:
+            if e.code != 401:
+                raise
+            span.retries += 1
+            self.connect()
+            result = fn()
+        except requests.exceptions.ConnectionError:
+            span.retries += 1
+            self.connect()
+            result = fn()
+        self._last_ok = time.monotonic()
+        return result
+
+
+class SheetSnapshot:
+    """Local copy of one worksheet: the header plus every data row, as records."""
+
+    def __init__(self, values):
+        self.header = list(values[0]) if values else []
+        self.rows = []
+        self.records = []
+        self.index = None  # optional derived index, kept in step by append()
+        self.loaded_at = time.monotonic()
+        for row in values[1:]:
+            self.append(row)
+
+    def normalize(self, row):
+        # Pad + numericise like get_all_records() so cached reads look identical
+        cells = ["" if v is None else str(v) for v in row]
+        cells += [""] * (len(self.header) - len(cells))
+        return numericise_all(cells)
+
+    def append(self, row):
+        cells = self.normalize(row)
+        self.rows.append(cells)
+        self.records.append(dict(zip(self.header, cells)))
+        if self.index is not None:
+            self.index.add(cells)
+
+    def set_cell(self, row_id, col, value):
+        # row_id is the sheet row number (1 = header)
+        cells = self.rows[row_id - 2]
+        cells[col - 1] = value
+        self.records[row_id - 2][self.header[col - 1]] = value
+
+    def age(self):
+        return time.monotonic() - self.loaded_at
+
+    def last_col(self):
+        # Column letter of the last header cell, e.g. 'D'
+        return rowcol_to_a1(1, max(len(self.header), 1))[:-1]
+
+
+class EntryIndex:
+    """daily_entries grouped by (date, goal_name) with per-day totals (last reading for
+    measurements) and last RPE."""
+
+    def __init__(self, header, rows=()):
+        # Normalize headers once per sheet ('Goal Name ', 'Value', ...) instead of per row
+        cols = header_columns(header)
+        self._date = cols.get("date")
+        self._goal = cols.get("goal_name")
+        self._value = cols.get("value")
+        self._rpe = cols.get("rpe")
+        self._entries = cols.get("entries")  # set on summary rows left by CoachDB.compact()
+        self.days = {}     # (date, goal_name) -> [total, last_rpe]
+        self.history = {}  # goal_name -> [(date, value), ...] in sheet order
+        self.counts = {}   # date -> rows logged that day
+        self.goals = set() # every goal_name with a row, numeric value or not
+        for cells in rows:
+            self.add(cells)
+
+    def _cell(self, cells, col, default=""):
+        return cells[col] if col is not None and col < len(cells) else default
+
+    def add(self, cells):
+        date = str(self._cell(cells, self._date))
+        goal = self._cell(cells, self._goal)
+        if goal != "":
+            self.goals.add(str(goal))
+        entries = self._cell(cells, self._entries)
+        self.counts[date] = self.counts.get(date, 0) + (int(entries) if isinstance(entries, (int, float)) else 1)
+
+        raw = self._cell(cells, self._value, 0)
+        try:
+            value = float(raw) if raw != "" else 0.0
+        except ValueError:
+            return  # Skip bad numbers
+        day = self.days.setdefault((date, goal), [0.0, None])
+        day[0] = value if goal in MEASUREMENTS else day[0] + value
+        rpe = self._cell(cells, self._rpe)
+        if rpe:
+            day[1] = rpe
+        if raw != "":
+            self.history.setdefault(goal, []).append((date, value))
+
+    def total(self, date, goal):
+        """Returns (total, last_rpe) for one goal on one day."""
+        day = self.days.get((date, goal))
+        return (day[0], day[1]) if day else (0, None)
+
+    def has(self, date, goal):
+        return (date, goal) in self.days
+
+
+class WriteResult:
+    """Outcome of one buffered write after a batch commit."""
+
+    def __init__(self, kind, worksheet, values, error=None):
+        self.kind = kind          # "append" | "update"
+        self.worksheet = worksheet
+        self.values = values
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class BatchWriteError(Exception):
+    """Raised when a write batch fails to commit; `results` says which ops were lost."""
+
+    def __init__(self, results):
+        self.results = results
+        failed = [r for r in results if not r.ok]
+        super().__init__(f"{len(failed)} of {len(results)} writes failed: {failed[0].error}")
+
+
+def _cell_data(value):
+    # Mirrors append_row's RAW input: numbers stay numbers, everything else is text
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": "" if value is None else str(value)}}
+
+
+def _retryable(error):
+    """Whether an outbox write that failed with `error` could still land later."""
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.code == 429 or error.code >= 500  # 4xx (bad range, deleted tab) won't fix itself
+    return not isinstance(error, gspread.exceptions.WorksheetNotFound)
+
+
+@st.cache_resource(show_spinner=False)
+def get_connection():
+    """Process-lifetime connection, reused across reruns and sessions."""
+    creds_dict = dict(st.secrets["gcp_service_account"])
+    # Fix private key formatting if necessary
+    creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
+    # One budget per service account, shared by every session in this process
+    scheduler = SheetsScheduler(reads_per_minute=st.secrets.get("sheets_reads_per_minute", 60),
+                                writes_per_minute=st.secrets.get("sheets_writes_per_minute", 60))
+    return SheetsConnection(creds_dict, scheduler)
+
+
+class CoachDB(CoachStorage):
+    # Seconds a cached worksheet is served before it is re-read from Sheets
+    DEFAULT_CACHE_TTL = 60
+    # compact() keeps this many days of rows in the hot tabs; the job runs daily
+    COMPACT_HORIZON_DAYS = 90
+    COMPACT_INTERVAL = 24 * 60 * 60
+
+    def __init__(self, cache_ttl=None, outbox_path=None):
+        # Authenticate once per process (see get_connection)
+        try:
+            self.conn = get_connection()
+        except gspread.SpreadsheetNotFound:
             st.error("❌ Could not find 'super_coach_db' in Google Sheets. Did you share it with the service account email?")
             st.stop()
 
-        # Connect to Tabs
-        self.ws_goals = self.sheet.worksheet("goals")
-        self.ws_entries = self.sheet.worksheet("daily_entries")
-        self.ws_food = self.sheet.worksheet("food_logs")
-        self.ws_chat = self.sheet.worksheet("chat_history")
-        self.ws_schedule = self.sheet.worksheet("schedule")
+        self.cache_ttl = self.DEFAULT_CACHE_TTL if cache_ttl is None else cache_ttl
+        self._cache = {}
+        self._cache_locks = {name: threading.RLock() for name in self.conn.worksheets}
+        self._chat_rows = None  # sheet row of the newest chat message, once known
+        self._bulk_headers = {}  # tab -> header row, read once per bulk copy (see bulk_append)
+        self._local = threading.local()  # per-session write batch (see batch())
+        # Independent worksheet reads run side by side (see load_sidebar)
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="coachdb")
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        self.compact_error = None
+
+        # With an outbox, writes are journaled locally and sent by a background thread
+        self.outbox = None
+        if outbox_path:
+            self.outbox = Outbox(outbox_path)
+            self.outbox.start(self._deliver, self._recover, self._delivered,
+                              retryable=_retryable, dead=self._dead_lettered)
+
+    # --- CACHE ---
+    def _snapshot(self, name):
+        """Read-through: serves the cached worksheet, re-reading it once the TTL runs out."""
+        with self._cache_locks[name], tracing.span("cache", "snapshot", name) as span:
+            snap = self._cache.get(name)
+            span.cache = "hit"
+            if snap is not None and snap.age() > self.cache_ttl:
+                if name in APPEND_ONLY and snap.header and self._tail_sync(name, snap):
+                    snap.loaded_at = time.monotonic()
+                    span.cache = "tail"
+                else:
+                    snap = None
+            if snap is None:
+                span.cache = "miss"
+                values = self.conn.run(lambda: self.conn.worksheet(name).get_all_values(), "get_all_values", name)
+                snap = self._cache[name] = SheetSnapshot(values)
+                # Writes still waiting in the outbox aren't in Sheets yet; lay them back on top
+                for _, kind, _, op in (self.outbox.pending(name) if self.outbox else []):
+                    try:
+                        self._apply(snap, kind, op)
+                    except (IndexError, KeyError):
+                        pass  # targets a row that no longer exists
+            return snap
+
+    @staticmethod
+    def _apply(snap, kind, values):
+        if kind == "append":
+            for row in values:
+                snap.append(row)
+        else:
+            snap.set_cell(*values)
+
+    def _tail_sync(self, name, snap):
+        """Pulls only rows added since the last sync. Returns False if a full resync is needed."""
+        last_row = len(snap.rows) + 1  # sheet row of the newest row we already hold
+        col = snap.last_col()
+        header, tail = self.conn.run(
+            lambda: self.conn.worksheet(name).batch_get([f"A1:{col}1", f"A{last_row}:{col}"]),
+            "batch_get", name, (col, last_row))
+        header = list(header[0]) if header else []
+        header += [""] * (len(snap.header) - len(header))
+        if header != snap.header:
+            return False  # columns changed
+
+        # Re-read our newest row as an anchor: if it moved, rows were deleted or inserted
+        anchor = snap.rows[-1] if snap.rows else snap.normalize(snap.header)
+        if not tail or snap.normalize(tail[0]) != anchor:
+            return False
+
+        for row in tail[1:]:
+            snap.append(row)
+        return True
+
+    def _records(self, name):
+        return self._snapshot(name).records
+
+    def _entry_index(self):
+        """Index over daily_entries, built once per snapshot and updated on append."""
+        with self._cache_locks["daily_entries"]:
+            snap = self._snapshot("daily_entries")
+            if snap.index is None:
+                snap.index = EntryIndex(snap.header, snap.rows)
+            return snap.index
+
+    def _patch(self, name, fn):
+        # Apply a local edit that mirrors a successful write; cold caches are left cold
+        with self._cache_locks[name]:
+            snap = self._cache.get(name)
+            if snap is None:
+                return
+            try:
+                fn(snap)
+            except (IndexError, KeyError):
+                # Local copy no longer lines up with the sheet; re-read next time
+                self._cache.pop(name, None)
+
+    def prefetch(self, *names):
+        """Warms several worksheets concurrently; cache hits return immediately."""
+        futures = [self._pool.submit(tracing.propagate(self._snapshot), name) for name in names]
+        for f in futures:
+            f.result()  # surface the first error
+
+    def load_sidebar(self, commander=True, include_chat=False, chat_limit=10):
+        """Fetches the sidebar's data in parallel and returns a SidebarSnapshot.
+
+        Page latency tracks the slowest worksheet read instead of the sum of them.
+        """
+        names = ["daily_entries"] + (["goals", "schedule"] if commander else [])
+        chat = self._pool.submit(tracing.propagate(self.get_chat_page), None, chat_limit) if include_chat else None
+        self.prefetch(*names)
+
+        snap = SidebarSnapshot(self.is_weight_logged_today())
+        if commander:
+            snap.schedule = self.get_full_schedule()
+            snap.progress = self.get_progress()
+        if chat is not None:
+            snap.chat, snap.chat_cursor = chat.result()
+        return snap
+
+    def invalidate(self, name=None):
+        """Drops one cached worksheet (or all of them) so the next read goes to Sheets."""
+        for key in ([name] if name else list(self._cache_locks)):
+            with self._cache_locks[key]:
+                self._cache.pop(key, None)
+            self._bulk_headers.pop(key, None)
+
+    # Tabs are looked up through the connection so a reconnect swaps them transparently
+    @property
+    def sheet(self):
+        return self.conn.sheet
+
+    @property
+    def ws_goals(self):
+        return self.conn.worksheet("goals")
+
+    @property
+    def ws_entries(self):
+        return self.conn.worksheet("daily_entries")
+
+    @property
+    def ws_food(self):
+        return self.conn.worksheet("food_logs")
+
+    @property
+    def ws_chat(self):
+        return self.conn.worksheet("chat_history")
+
+    @property
+    def ws_schedule(self):
+        return self.conn.worksheet("schedule")
+
+    # --- WRITES ---
+    def _write(self, kind, name, values):
+        if self.outbox is not None:
+            # Journal + local patch under one lock so the cache keeps the outbox's order
+            with self._cache_locks[name]:
+                self.outbox.enqueue(kind, name, values)
+                self._patch(name, lambda snap: self._apply(snap, kind, values))
+            return
+
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            batch.append((kind, name, values))
+        elif kind == "append":
+            self.conn.run(lambda: self.conn.worksheet(name).append_rows(values), "append_rows", name)
+            self._count_chat(name, values)
+        else:
+            self.conn.run(lambda: self.conn.worksheet(name).update_cell(*values), "update_cell", name)
+        # Patch immediately so reads within the same interaction see the write
+        self._patch(name, lambda snap: self._apply(snap, kind, values))
+
+    def _append(self, name, rows):
+        self._write("append", name, rows)
+
+    def _update_cell(self, name, row_id, col, value):
+        self._write("update", name, [row_id, col, value])
+
+    def _count_chat(self, name, rows):
+        # Keep the chat row counter (see get_chat_page) in step with delivered appends
+        if name == "chat_history":
+            with self._cache_locks[name]:
+                if self._chat_rows is not None:
+                    self._chat_rows += len(rows)
+
+    @contextmanager
+    def batch(self):
+        """Buffers this thread's appends and cell updates, committing them in one request.
+
+        Writes are flushed on exit even if the block raised, since each one was already
+        shown to the user. Nested batch() blocks join the outer one. Raises
+        BatchWriteError (with per-operation results) if the commit fails.
+        """
+        if getattr(self._local, "batch", None) is not None:
+            yield
+            return
+        self._local.batch = []
+        try:
+            yield
+        finally:
+            ops, self._local.batch = self._local.batch, None
+            results = self.commit(ops)
+        if any(not r.ok for r in results):
+            raise BatchWriteError(results)
+
+    def commit(self, ops, invalidate_on_error=True):
+        """Sends buffered ops as a single spreadsheet batch_update, preserving order."""
+        if not ops:
+            return []
+
+        def build():
+            requests_ = []
+            for kind, name, values in ops:
+                sheet_id = self.conn.worksheet(name).id
+                if kind == "append":
+                    requests_.append({"appendCells": {
+                        "sheetId": sheet_id,
+                        "rows": [{"values": [_cell_data(v) for v in row]} for row in values],
+                        "fields": "userEnteredValue",
+                    }})
+                else:
+                    row_id, col, value = values
+                    requests_.append({"updateCells": {
+                        "start": {"sheetId": sheet_id, "rowIndex": row_id - 1, "columnIndex": col - 1},
+                        "rows": [{"values": [_cell_data(value)]}],
+                        "fields": "userEnteredValue",
+                    }})
+            return self.sheet.batch_update({"requests": requests_})
+
+        try:
+            self.conn.run(build, "batch_update", ",".join(sorted({name for _, name, _ in ops})))
+            error = None
+            for kind, name, values in ops:
+                if kind == "append":
+                    self._count_chat(name, values)
+        except Exception as e:
+            error = e
+            # The request is all-or-nothing: drop the optimistic local patches
+            if invalidate_on_error:
+                for name in {name for _, name, _ in ops}:
+                    self.invalidate(name)
+                self._chat_rows = None
+        return [WriteResult(kind, name, values, error) for kind, name, values in ops]
+
+    # --- OUTBOX ---
+    def _deliver(self, ops):
+        # Runs on the outbox thread; the local cache already reflects these ops
+        results = self.commit([(kind, name, values) for _, kind, name, values in ops],
+                              invalidate_on_error=False)
+        if results and not results[0].ok:
+            raise results[0].error
+
+    def _delivered(self, ops, started_at):
+        # A sheet re-read while the ops were in flight may hold them twice (remote + replayed)
+        for name in {op[2] for op in ops}:
+            with self._cache_locks[name]:
+                snap = self._cache.get(name)
+                if snap is not None and snap.loaded_at >= started_at:
+                    self._cache.pop(name, None)
+
+    def _dead_lettered(self, ops):
+        # The op will never reach Sheets: drop its optimistic patch
+        for name in {op[2] for op in ops} & set(self._cache_locks):
+            self.invalidate(name)
+        self._chat_rows = None
+
+    def _recover(self, ops):
+        """True if in-flight appends from before a crash already reached Sheets.
+
+        One batch_update is all-or-nothing, so checking one worksheet's tail is enough.
+        """
+        appends = [(name, values) for _, kind, name, values in ops if kind == "append"]
+        if not appends:
+            return False  # cell updates are idempotent; just resend
+        name = appends[0][0]
+        rows = [row for n, values in appends if n == name for row in values]
+        ws = self.conn.worksheet(name)
+        last = len(self.conn.run(lambda: ws.col_values(1), "col_values", name))
+        start = max(1, last - len(rows) - 50)
+        tail = self.conn.run(lambda: ws.get(f"A{start}:Z{last}"), "get", name, (start, last))
+
+        probe = SheetSnapshot([[""] * max(len(r) for r in rows)])
+        want = [probe.normalize(r) for r in rows]
+        have = [probe.normalize(list(r)[:len(probe.header)]) for r in tail]
+        return any(have[i:i + len(want)] == want for i in range(len(have) - len(want) + 1))
+
+    def queue_depth(self):
+        """Writes journaled locally but not yet in Sheets (0 without an outbox)."""
+        return self.outbox.depth() if self.outbox else 0
+
+    def sync_error(self):
+        return self.outbox.last_error() if self.outbox else None
+
+    def dead_letters(self):
+        return self.outbox.dead_letters() if self.outbox else []
+
+    # --- COMPACTION ---
+    def compact(self, horizon_days=None):
+        """Moves rows older than the horizon out of the hot tabs. Returns {tab: rows archived}.
+
+        Old rows are appended to per-month archive tabs first, then deleted from the
+        hot tab in one batch_update (row deletes + inserts don't disturb concurrent
+        appends at the bottom). daily_entries keeps one summary row per (date, goal)
+        with the day's total and an `entries` count, so get_metric_history,
+        get_progress-style totals and get_consistency_data give the same answers.
+        Measurement goals (storage.MEASUREMENTS) keep the day's last reading instead.
+        A failure between the two steps can duplicate archive rows, never lose any.
+        """
+        horizon = self.COMPACT_HORIZON_DAYS if horizon_days is None else horizon_days
+        cutoff = (datetime.date.today() - datetime.timedelta(days=horizon)).isoformat()
+        with self._compact_lock:
+            return {name: self._compact(name, cutoff) for name in COMPACTED}
+
+    def _compact(self, name, cutoff):
+        with self._cache_locks[name]:
+            self._cache.pop(name, None)
+            snap = self._snapshot(name)
+            cols = header_columns(snap.header)
+            date_col = cols.get("date", 0) if name == "daily_entries" else 0
+
+            # Rows are appended in time order, so the old ones are a prefix
+            old = 0
+            while old < len(snap.rows) and str(snap.rows[old][date_col])[:10] < cutoff:
+                old += 1
+            entries_col = cols.get("entries") if name == "daily_entries" else None
+            raw = [r for r in snap.rows[:old] if entries_col is None or r[entries_col] == ""]
+            if not raw:
+                return 0
+
+            by_month = {}
+            for r in raw:
+                by_month.setdefault(str(r[date_col])[:7].replace("-", "_"), []).append(r)
+            for month, rows in by_month.items():
+                ws = self._archive(ARCHIVE_TITLE.format(name=name, month=month), snap.header)
+                self.conn.run(lambda: ws.append_rows(rows), "append_rows", ws.title)
+
+            header_fix = []
+            summaries = []
+            if name == "daily_entries":
+                if entries_col is None:
+                    entries_col = len(snap.header)
+                    header_fix = [entries_col]
+                summaries = self._summarize(snap.rows[:old], cols, entries_col)
+            self._replace_prefix(name, old, summaries, header_fix)
+
+            self._cache.pop(name, None)
+            if name == "chat_history":
+                self._chat_rows = None
+            return len(raw)
+
+    @staticmethod
+    def _summarize(rows, cols, entries_col):
+        # One row per (date, goal): summed value (last reading for measurements),
+        # last RPE, number of entries it replaces. Earlier summaries fold in by their counts.
+        date_col, goal_col = cols.get("date", 0), cols.get("goal_name", 1)
+        value_col, rpe_col = cols.get("value", 2), cols.get("rpe", 3)
+        days = {}
+        for r in rows:
+            r = list(r) + [""] * (entries_col + 1 - len(r))
+            goal = r[goal_col]
+            day = days.setdefault((str(r[date_col])[:10], goal), ["", "", 0])
+            if isinstance(r[value_col], (int, float)):
+                day[0] = r[value_col] if goal in MEASUREMENTS else (day[0] or 0) + r[value_col]
+            if r[rpe_col] != "":
+                day[1] = r[rpe_col]
+            day[2] += r[entries_col] if isinstance(r[entries_col], (int, float)) else 1
+        out = []
+        for (date, goal), (value, rpe, entries) in days.items():
+            cells = [""] * (max(date_col, goal_col, value_col, rpe_col, entries_col) + 1)
+            cells[date_col], cells[goal_col], cells[value_col] = date, goal, value
+            cells[rpe_col], cells[entries_col] = rpe, entries
+            out.append(cells)
+        return out
+
+    def _archive(self, title, header):
+        """The archive tab `title`, created with `header` if it doesn't exist yet."""
+        if title not in self.conn.worksheets:
+            ws = self.conn.run(lambda: self.sheet.add_worksheet(title, rows=1, cols=max(len(header), 1)),
+                               "add_worksheet", title)
+            self.conn.run(lambda: ws.append_rows([header]), "append_rows", title)
+            self.conn.worksheets[title] = ws
+        return self.conn.worksheet(title)
+
+    def _replace_prefix(self, name, old, summaries, header_fix):
+        # Data rows 2..old+1 become `summaries`, in one all-or-nothing request
+        ws = self.conn.worksheet(name)
+        requests_ = []
+        for col in header_fix:
+            if col >= ws.col_count:
+                requests_.append({"appendDimension": {"sheetId": ws.id, "dimension": "COLUMNS",
+                                                      "length": col + 1 - ws.col_count}})
+            requests_.append({"updateCells": {
+                "start": {"sheetId": ws.id, "rowIndex": 0, "columnIndex": col},
+                "rows": [{"values": [_cell_data("entries")]}],
+                "fields": "userEnteredValue",
+            }})
+        requests_.append({"deleteDimension": {"range": {
+            "sheetId": ws.id, "dimension": "ROWS", "startIndex": 1, "endIndex": 1 + old}}})
+        if summaries:
+            requests_.append({"insertDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS", "startIndex": 1, "endIndex": 1 + len(summaries)},
+                "inheritFromBefore": False}})
+            requests_.append({"updateCells": {
+                "start": {"sheetId": ws.id, "rowIndex": 1, "columnIndex": 0},
+                "rows": [{"values": [_cell_data(v) for v in row]} for row in summaries],
+                "fields": "userEnteredValue",
+            }})
+        self.conn.run(lambda: self.sheet.batch_update({"requests": requests_}), "batch_update", name)
+
+    def start_compaction(self, horizon_days=None, interval=None):
+        """Runs compact() on a daemon thread every `interval` seconds (once per process)."""
+        if self._compactor is not None:
+            return
+        interval = interval or self.COMPACT_INTERVAL
+
+        def run():
+            while True:
+                try:
+                    self.compact(horizon_days)
+                    self.compact_error = None
+                except Exception as e:
+                    self.compact_error = str(e)
+                time.sleep(interval)
+
+        self._compactor = threading.Thread(target=run, name="coachdb-compact", daemon=True)
+        self._compactor.start()
 
     # --- SCHEDULE METHODS ---
     def create_schedule(self, tasks):
@@ -46,11 +696,11 @@ class CoachDB:
         for time_slot, task in tasks:
             new_rows.append([today, time_slot, task, "PENDING"])
             
-        self.ws_schedule.append_rows(new_rows)
+        self._append("schedule", new_rows)
 
     def get_current_mission(self):
         today = datetime.date.today().isoformat()
-        records = self.ws_schedule.get_all_records()
+        records = self._records("schedule")
         
         # Filter for Today + Pending
         # We assume the records are dictionaries: {'date': '...', 'status': '...'}
@@ -64,11 +714,11 @@ class CoachDB:
 
     def mark_mission_done(self, row_id):
         # Update column D (Status) to DONE
-        self.ws_schedule.update_cell(row_id, 4, "DONE")
+        self._update_cell("schedule", row_id, 4, "DONE")
         
     def get_full_schedule(self):
         today = datetime.date.today().isoformat()
-        records = self.ws_schedule.get_all_records()
+        records = self._records("schedule")
         
         # Filter for today
         todays_plan = []
@@ -84,110 +734,212 @@ class CoachDB:
     def log_metric(self, name, value, rpe=None):
         today = datetime.date.today().isoformat()
         # Append row: date, goal_name, value, rpe
-        self.ws_entries.append_row([today, name, value, rpe if rpe else ""])
+        row = [today, name, value, rpe if rpe else ""]
+        self._append("daily_entries", [row])
+        self._notify(name, value, today)
 
     def log_food(self, content):
         today = datetime.date.today().isoformat()
         now = datetime.datetime.now().strftime("%H:%M")
-        self.ws_food.append_row([today, now, content])
+        row = [today, now, content]
+        self._append("food_logs", [row])
 
     def log_chat(self, sender, message):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.ws_chat.append_row([now, sender, message])
+        row = [now, sender, message]
+        self._append("chat_history", [row])
         
     def get_chat_history(self, limit=20):
-        # Get all values
-        all_values = self.ws_chat.get_all_values()
-        # Skip header, get last 'limit' rows
-        if len(all_values) < 2: return []
-        
-        data = all_values[1:] # Remove header
-        recent = data[-limit:] # Last N
-        
         # Format: [(sender, msg), ...]
-        return [(r[1], r[2]) for r in recent]
+        return self.get_chat_page(limit=limit)[0]
+
+    def get_chat_page(self, before_row=None, limit=20):
+        """Returns ([(sender, msg), ...], cursor) for the `limit` messages above `before_row`.
+
+        Only that window is fetched from Sheets. Pass the returned cursor back as
+        `before_row` to page further back; a cursor of 2 means there is nothing older.
+        """
+        with self._cache_locks["chat_history"]:
+            snap = self._cache.get("chat_history")
+            if snap is not None:
+                rows = self._snapshot("chat_history").rows
+                end = len(rows) if before_row is None else before_row - 2
+                start = max(0, end - limit)
+                return self._format_chat(rows[start:end]), start + 2
+
+            if before_row is not None:
+                end = before_row - 1
+                if end < 2:
+                    return [], 2
+                start = max(2, end - limit + 1)
+                window = self.conn.run(lambda: self.ws_chat.get(f"A{start}:C{end}"), "get", "chat_history", (start, end))
+                return self._format_chat(window), start
+
+            for _ in range(2):
+                last = self._chat_row_count()
+                start = max(2, last - limit + 1)
+                # Open-ended range: also picks up rows other sessions appended since we counted
+                window = self.conn.run(lambda: self.ws_chat.get(f"A{start}:C"), "get", "chat_history", (start,))
+                if len(window) >= last - start + 1:
+                    break
+                self._chat_rows = None  # rows were removed; count again
+            self._chat_rows = start + len(window) - 1
+
+            # Messages still in the outbox come after everything already in Sheets
+            pending = [row for _, kind, _, values in (self.outbox.pending("chat_history") if self.outbox else [])
+                       if kind == "append" for row in values][-limit:] if limit else []
+            keep = limit - len(pending)
+            window = window[-keep:] if keep > 0 else []
+            return self._format_chat(window + pending), self._chat_rows - len(window) + 1
+
+    def _chat_row_count(self):
+        if self._chat_rows is None:
+            # One column instead of the whole log
+            self._chat_rows = max(len(self.conn.run(lambda: self.ws_chat.col_values(1), "col_values", "chat_history")), 1)
+        return self._chat_rows
+
+    @staticmethod
+    def _format_chat(rows):
+        rows = [list(r) + [""] * (3 - len(r)) for r in rows]
+        return [(r[1], str(r[2])) for r in rows]
 
     def get_progress(self):
         today = datetime.date.today().isoformat()
         
         # 1. Get Goals
-        goals = self.ws_goals.get_all_records()
+        goals = self._records("goals")
         
-        # 2. Get Today's Entries
-        entries = self.ws_entries.get_all_records()
+        # 2. Look up today's totals per goal (pre-aggregated in the index)
+        index = self._entry_index()
         
-        # --- DEBUG PRINT (This will show up in your terminal logs) ---
-        if entries:
-            print(f"DEBUG: Found keys in first row: {entries[0].keys()}")
-        # ------------------------------------------------------------
-
-        # 3. Aggregate
         progress = []
         for g in goals:
-            g_name = g['name']
-            total = 0
-            last_rpe = None
-            
-            for e in entries:
-                # Normalize keys: strip spaces and lowercase them just for checking
-                # (This fixes 'Value', 'value ', 'Goal Name', etc.)
-                row = {k.lower().strip(): v for k, v in e.items()}
-                
-                # Check date
-                row_date = str(row.get('date', ''))
-                row_goal = row.get('goal_name', '')
-                
-                if row_date == today and row_goal == g_name:
-                    try:
-                        # Safer fetch: defaults to 0 if empty or missing
-                        val = row.get('value', 0)
-                        total += float(val) if val != "" else 0.0
-                        
-                        if row.get('rpe'): 
-                            last_rpe = row.get('rpe')
-                    except ValueError:
-                        continue # Skip bad numbers
-            
-            progress.append((g_name, g['target'], g['unit'], total, last_rpe))
+            total, last_rpe = index.total(today, g['name'])
+            progress.append((g['name'], g['target'], g['unit'], total, last_rpe))
             
         return progress
 
     # --- DASHBOARD METHODS ---
     def get_metric_history(self, goal_name):
-        records = self.ws_entries.get_all_records()
-        # Filter
-        data = []
-        for r in records:
-            if r['goal_name'] == goal_name:
-                data.append((r['date'], float(r['value'])))
-        return data
+        return list(self._entry_index().history.get(goal_name, []))
+
+    def get_logged_goal_names(self):
+        return sorted(self._entry_index().goals)
 
     def get_all_goal_names(self):
-        goals = self.ws_goals.get_all_records()
+        goals = self._records("goals")
         return [g['name'] for g in goals]
 
+    def get_goal_synonyms(self):
+        """Keyword -> goal name for the chat parser: each goal's own name plus its 'aliases' column."""
+        synonyms = {}
+        for g in self._records("goals"):
+            synonyms[str(g['name']).lower()] = g['name']
+            for alias in str(g.get('aliases', '')).split(","):
+                if alias.strip():
+                    synonyms[alias.strip().lower()] = g['name']
+        return synonyms
+
     def get_consistency_data(self):
-        records = self.ws_entries.get_all_records()
-        # Count entries per date
-        counts = {}
-        for r in records:
-            d = r['date']
-            counts[d] = counts.get(d, 0) + 1
-        return list(counts.items())
+        # Entries per date, counted as rows are indexed
+        return list(self._entry_index().counts.items())
     
     def is_weight_logged_today(self):
         """Checks if 'Weight' has been logged for the current date."""
         today = datetime.date.today().isoformat()
         try:
-            # efficient way: get all records and check in python
-            entries = self.ws_entries.get_all_records()
-            for e in entries:
-                if str(e['date']) == today and e['goal_name'] == "Weight":
-                    return True
+            return self._entry_index().has(today, "Weight")
         except:
             return False # Safety fallback
-        return False
 
     def get_raw_history(self):
         """Returns all log entries for the history page."""
-        return self.ws_entries.get_all_records()
\ No newline at end of file
+        return list(self._records("daily_entries"))
+
+    # --- STORAGE INTERFACE (see storage.CoachStorage) ---
+    def get_goals(self):
+        return [{"name": g['name'], "target": g['target'], "unit": g['unit'],
+                 "category": g.get('category') or "General"}
+                for g in self._records("goals")]
+
+    def add_new_goal(self, name, target, unit, category):
+        if name in self.get_all_goal_names():
+            return False
+        self._append("goals", [self._to_sheet("goals", [[name, target, unit, category]])[0]])
+        return True
+
+    def get_day_total(self, date, goal_name):
+        return self._entry_index().total(date, goal_name)[0]
+
+    def get_todays_food(self):
+        # Sheets food rows carry a time instead of a meal type
+        today = datetime.date.today().isoformat()
+        cols = header_columns(self._snapshot("food_logs").header)
+        rows = self._snapshot("food_logs").rows
+        d, t, c = cols.get("date", 0), cols.get("time", 1), cols.get("content", 2)
+        return [(r[t], r[c], "") for r in rows if str(r[d]) == today]
+
+    # --- BULK COPY ---
+    def count_rows(self, table):
+        ws = self.conn.worksheet(table)
+        return max(len(self.conn.run(lambda: ws.col_values(1), "col_values", table)) - 1, 0)
+
+    def iter_rows(self, table, chunk_size=500, start=0):
+        """Reads the tab in row ranges so huge histories never sit in memory at once."""
+        ws = self.conn.worksheet(table)
+        header = self.conn.run(lambda: ws.row_values(1), "row_values", table)
+        cols = header_columns(header)
+        layout = [cols.get(c) for c in TABLES[table]]
+        probe = SheetSnapshot([header])
+        start += 2  # first data row is 2
+        while True:
+            end = start + chunk_size - 1
+            chunk = self.conn.run(lambda: ws.get(f"A{start}:Z{end}"), "get", table, (start, end))
+            if not chunk:
+                return
+            rows = []
+            for r in chunk:
+                cells = probe.normalize(r)
+                rows.append([cells[i] if i is not None and i < len(cells) else "" for i in layout])
+            if table == "goals":
+                for row in rows:
+                    row[3] = row[3] or "General"
+            yield rows
+            if len(chunk) < chunk_size:
+                return
+            start = end + 1
+
+    def bulk_append(self, table, rows):
+        """Appends one chunk. The tab's cache goes stale; copy_storage invalidates it at the end."""
+        if table == "goals":
+            existing = set(self.get_all_goal_names())
+            rows = [r for r in rows if r[0] not in existing]
+        if not rows:
+            return
+        # Only the header is needed, not a full read of a tab we are about to grow
+        if table not in self._bulk_headers:
+            ws = self.conn.worksheet(table)
+            self._bulk_headers[table] = self.conn.run(lambda: ws.row_values(1), "row_values", table)
+        values = self._to_sheet(table, rows, self._bulk_headers[table])
+        # One append_rows call per chunk, straight to Sheets (bypasses the outbox)
+        self.conn.run(lambda: self.conn.worksheet(table).append_rows(values), "append_rows", table)
+        if table == "goals":
+            self.invalidate(table)  # tiny tab; keeps the duplicate check above exact
+        elif table == "chat_history":
+            self._chat_rows = None
+
+    def _to_sheet(self, table, rows, header=None):
+        # Canonical TABLES layout -> this tab's actual column order
+        header = self._snapshot(table).header if header is None else header
+        cols = header_columns(header)
+        width = max(len(header), len(TABLES[table]))
+        out = []
+        for row in rows:
+            cells = [""] * width
+            for name, value in zip(TABLES[table], row):
+                if name in cols:
+                    cells[cols[name]] = value
+                elif name != "category":  # goals sheets may not track a category
+                    cells[TABLES[table].index(name)] = value
+            out.append(cells)
+        return out
@@ -0,0 +1,354 @@
+import datetime
+import random
+import re
+import threading
+import time
+from gspread.utils import a1_to_rowcol
+from scheduler import is_background
+
+# In-process stand-ins for gspread and Gemini, used by benchmark.py to run the real
+# Streamlit scripts offline. Every call sleeps for an injected latency and is
+# counted, so reruns can be compared by round trips and bytes as well as time.
+
+GOALS = [
+    ["name", "target", "unit", "category"],
+    ["Pullups", "15", "reps", "Athleticism"],
+    ["Pushups", "50", "reps", "Athleticism"],
+    ["Plyo", "1", "session", "Athleticism"],
+    ["DSA", "3", "problems", "Career"],
+    ["Weight", "70", "kg", "Lifestyle"],
+]
+
+
+def _size(row):
+    # Roughly what the row costs as JSON in an API response
+    return sum(len(str(v)) + 3 for v in row) + 2
+
+
+class CallStats:
+    """Thread-safe call log shared by a fake spreadsheet and its worksheets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = []  # (kind, method, worksheet, bytes, background)
+
+    def record(self, kind, method, worksheet=None, nbytes=0):
+        background = is_background()
+        with self._lock:
+            self.calls.append((kind, method, worksheet, nbytes, background))
+
+    def mark(self):
+        with self._lock:
+            return len(self.calls)
+
+    def since(self, mark=0):
+        """Call/byte totals (foreground, background), Gemini calls and a per-method count since `mark`."""
+        with self._lock:
+            calls = self.calls[mark:]
+        out = {"calls": 0, "bytes_read": 0, "background_calls": 0, "background_bytes": 0,
+               "gemini_calls": 0, "by_method": {}}
+        for kind, method, worksheet, nbytes, background in calls:
+            if kind == "gemini":
+                out["gemini_calls"] += 1
+                continue
+            if background:
+                out["background_calls"] += 1
+                out["background_bytes"] += nbytes
+                continue
+            out["calls"] += 1
+            out["bytes_read"] += nbytes
+            key = f"{method}({worksheet})" if worksheet else method
+            out["by_method"][key] = out["by_method"].get(key, 0) + 1
+        return out
+
+
+# --- SHEETS ---
+class FakeWorksheet:
+    """One tab held as a list of string rows; implements the gspread calls CoachDB makes."""
+
+    def __init__(self, sheet, title, values, sheet_id):
+        self.sheet = sheet
+        self.title = title
+        self.id = sheet_id
+        self.values = values
+        self._sizes = [_size(r) for r in values]
+        self._lock = threading.RLock()
+
+    @property
+    def col_count(self):
+        return max([26] + [len(r) for r in self.values[:1]])
+
+    def _call(self, method, rows=None, lo=0, hi=None):
+        time.sleep(self.sheet.latency)
+        nbytes = sum(self._sizes[lo:hi]) if rows is not None else 0
+        self.sheet.stats.record("sheets", method, self.title, nbytes)
+        return rows
+
+    def _range(self, a1):
+        # 'A5:C9' / 'A5:C' (open-ended) -> (first row index, end row index, last column)
+        first, _, last = a1.partition(":")
+        r0, _ = a1_to_rowcol(first if first[-1].isdigit() else first + "1")
+        end, c1 = len(self.values), 26
+        if last:
+            m = re.fullmatch(r"([A-Z]+)(\d*)", last)
+            c1 = a1_to_rowcol(m[1] + "1")[1]
+            if m[2]:
+                end = min(int(m[2]), end)
+        return r0 - 1, end, c1
+
+    def _slice(self, a1):
+        lo, hi, cols = self._range(a1)
+        return lo, hi, [list(r[:cols]) for r in self.values[lo:hi]]
+
+    # Reads
+    def get_all_values(self):
+        with self._lock:
+            rows = [list(r) for r in self.values]
+        return self._call("get_all_values", rows)
+
+    def get(self, a1):
+        with self._lock:
+            lo, hi, rows = self._slice(a1)
+        return self._call("get", rows, lo, hi)
+
+    def batch_get(self, ranges):
+        with self._lock:
+            slices = [self._slice(a1) for a1 in ranges]
+        time.sleep(self.sheet.latency)
+        nbytes = sum(sum(self._sizes[lo:hi]) for lo, hi, _ in slices)
+        self.sheet.stats.record("sheets", "batch_get", self.title, nbytes)
+        return [rows for _, _, rows in slices]
+
+    def col_values(self, col):
+        with self._lock:
+            values = [r[col - 1] if len(r) >= col else "" for r in self.values]
+        time.sleep(self.sheet.latency)
+        self.sheet.stats.record("sheets", "col_values", self.title, sum(len(v) + 3 for v in values))
+        return values
+
+    def row_values(self, row):
+        with self._lock:
+            values = list(self.values[row - 1]) if row <= len(self.values) else []
+        return self._call("row_values", values, row - 1, row)
+
+    def cell(self, row, col):
+        with self._lock:
+            cells = self.values[row - 1] if row <= len(self.values) else []
+            value = cells[col - 1] if col <= len(cells) else ""
+        self._call("cell", [], row - 1, row)
+        return type("Cell", (), {"row": row, "col": col, "value": value})()
+
+    # Writes
+    def append_rows(self, rows):
+        with self._lock:
+            self._append([[str(v) for v in r] for r in rows])
+        self._call("append_rows")
+
+    def append_row(self, row):
+        self.append_rows([row])
+
+    def update_cell(self, row, col, value):
+        with self._lock:
+            self._set(row - 1, col - 1, str(value))
+        self._call("update_cell")
+
+    def _append(self, rows):
+        self.values.extend(rows)
+        self._sizes.extend(_size(r) for r in rows)
+
+    def _set(self, row, col, value):
+        cells = self.values[row]
+        cells += [""] * (col + 1 - len(cells))
+        cells[col] = value
+        self._sizes[row] = _size(cells)
+
+
+class FakeSpreadsheet:
+    """The spreadsheet returned by FakeClient.open(): tabs plus batch_update."""
+
+    def __init__(self, tabs, latency=0.0, stats=None):
+        self.latency = latency
+        self.stats = stats or CallStats()
+        self._tabs = {title: FakeWorksheet(self, title, values, i + 1) for i, (title, values) in enumerate(tabs.items())}
+
+    def worksheets(self):
+        self.stats.record("sheets", "fetch_sheet_metadata")
+        time.sleep(self.latency)
+        return list(self._tabs.values())
+
+    def worksheet(self, title):
+        return self._tabs[title]
+
+    def fetch_sheet_metadata(self):
+        self.stats.record("sheets", "fetch_sheet_metadata")
+        time.sleep(self.latency)
+        return {"sheets": [{"properties": {"title": t, "sheetId": ws.id}} for t, ws in self._tabs.items()]}
+
+    def add_worksheet(self, title, rows=1, cols=26):
+        ws = self._tabs[title] = FakeWorksheet(self, title, [], len(self._tabs) + 1)
+        self.stats.record("sheets", "add_worksheet", title)
+        time.sleep(self.latency)
+        return ws
+
+    def batch_update(self, body):
+        by_id = {ws.id: ws for ws in self._tabs.values()}
+        for req in body["requests"]:
+            (kind, spec), = req.items()
+            if kind == "appendCells":
+                ws = by_id[spec["sheetId"]]
+                with ws._lock:
+                    ws._append([[_value(c) for c in r["values"]] for r in spec["rows"]])
+            elif kind == "updateCells":
+                start = spec["start"]
+                ws = by_id[start["sheetId"]]
+                with ws._lock:
+                    for i, r in enumerate(spec["rows"]):
+                        row = start["rowIndex"] + i
+                        if row >= len(ws.values):
+                            ws._append([[] for _ in range(row + 1 - len(ws.values))])
+                        for j, c in enumerate(r["values"]):
+                            ws._set(row, start["columnIndex"] + j, _value(c))
+            elif kind in ("deleteDimension", "insertDimension"):
+                rng = spec["range"]
+                ws = by_id[rng["sheetId"]]
+                if rng["dimension"] != "ROWS":
+                    continue
+                lo, hi = rng["startIndex"], rng["endIndex"]
+                with ws._lock:
+                    if kind == "deleteDimension":
+                        del ws.values[lo:hi], ws._sizes[lo:hi]
+                    else:
+                        ws.values[lo:lo] = [[] for _ in range(hi - lo)]
+                        ws._sizes[lo:lo] = [2] * (hi - lo)
+            # appendDimension: columns are unbounded here
+        self.stats.record("sheets", "batch_update")
+        time.sleep(self.latency)
+        return {"replies": [{} for _ in body["requests"]]}
+
+
+def _value(cell):
+    value = next(iter(cell.get("userEnteredValue", {"stringValue": ""}).values()))
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class FakeClient:
+    """What gspread.authorize() returns: open() hands back the one fake spreadsheet."""
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open(self, title):
+        self.spreadsheet.stats.record("sheets", "open")
+        time.sleep(self.spreadsheet.latency)
+        return self.spreadsheet
+
+
+def make_sheet(rows, latency=0.0, today=None):
+    """A super_coach_db spreadsheet with `rows` daily_entries (and a tenth as many chat/food rows).
+
+    Entries end yesterday, so the weigh-in nudge shows, and go back at most ~10 years.
+    """
+    today = today or datetime.date.today()
+    per_day = max(5, rows // 3650)
+    goals = [g[0] for g in GOALS[1:]]
+    days = {}
+    pool = {}  # reuse identical cell strings so 1M-row tabs stay small in memory
+
+    def day(i):
+        d = i // per_day + 1
+        if d not in days:
+            days[d] = (today - datetime.timedelta(days=d)).isoformat()
+        return days[d]
+
+    def cell(v):
+        return pool.setdefault(v, v)
+
+    entries = [["date", "goal_name", "value", "rpe"]]
+    for i in range(rows - 1, -1, -1):
+        goal = goals[i % len(goals)]
+        value = "71.5" if goal == "Weight" else cell(str(1 + i % 17))
+        entries.append([day(i), goal, value, cell(str(5 + i % 5)) if goal == "Pullups" else ""])
+
+    side = max(rows // 10, 1)
+    chat = [["timestamp", "sender", "message"]]
+    food = [["date", "time", "content"]]
+    for i in range(side - 1, -1, -1):
+        stamp = day(i * 10)
+        chat.append([f"{stamp} 0{i % 10}:00:00", "user" if i % 2 else "assistant",
+                     cell(f"Message {i % 50}: did my sets, how is the week looking?")])
+        food.append([stamp, cell(f"{8 + i % 12:02d}:30"), cell(f"Lunch: dal rice #{i % 30}")])
+
+    tabs = {
+        "goals": [list(g) for g in GOALS],
+        "daily_entries": entries,
+        "food_logs": food,
+        "chat_history": chat,
+        "schedule": [["date", "time_slot", "task", "status"]],
+    }
+    return FakeSpreadsheet(tabs, latency)
+
+
+# --- GEMINI ---
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        # Streamed replies arrive a few words at a time
+        words = self.text.split(" ")
+        for i in range(0, len(words), 4):
+            yield FakeResponse(" ".join(words[i:i + 4]) + " ")
+
+
+class FakeGemini:
+    """Canned Gemini replies after `latency` seconds; a `tail` share of calls take 10x as long."""
+
+    MODEL = "models/gemini-fake-flash"
+
+    def __init__(self, stats, latency=0.0, tail=0.0):
+        self.stats = stats
+        self.latency = latency
+        self.tail = tail
+
+    def reply(self, prompt):
+        prompt = str(prompt)
+        if "pipe separated" in prompt:
+            return "07:00|Weigh-in\n09:00|Deep Work\n18:00|Gym\n22:30|Sleep"
+        if "JSON" in prompt:
+            return '[["07:00", "Weigh-in"], ["09:00", "DSA"], ["18:00", "Gym"]]'
+        if "profile" in prompt.lower():
+            return "# PROFILE\n**Status:** Active\n- Consistent with pullups."
+        return "Solid work today. Hit your pullups before the gym closes and log dinner once you're done."
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        time.sleep(self.latency * (10 if random.random() < self.tail else 1))
+        self.stats.record("gemini", "generate_content", self.MODEL, 0)
+        response = FakeResponse(self.reply(prompt))
+        return iter(response) if stream else response
+
+    # google.generativeai
+    def configure(self, **kwargs):
+        pass
+
+    def list_models(self):
+        self.stats.record("gemini", "list_models")
+        time.sleep(self.latency)
+        return [type("Model", (), {"name": self.MODEL, "supported_generation_methods": ["generateContent"]})()]
+
+    def model(self, name=None, **kwargs):
+        return self
+
+
+def install(spreadsheet, gemini):
+    """Routes gspread, the service-account login and Gemini to the fakes (process-wide)."""
+    import gspread
+    import google.generativeai as genai
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    gspread.authorize = lambda creds: FakeClient(spreadsheet)
+    ServiceAccountCredentials.from_json_keyfile_dict = classmethod(lambda cls, keyfile, scopes=None: None)
+    genai.configure = gemini.configure
+    genai.list_models = gemini.list_models
+    genai.GenerativeModel = gemini.model
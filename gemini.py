@@ -0,0 +1,219 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+import google.generativeai as genai
+import streamlit as st
+import tracing
+
+_END = object()  # end-of-stream marker on a stream attempt's queue
+COUNTERS = ("calls", "hedged", "hedge_wins", "timeouts", "errors")
+
+
+@st.cache_resource(show_spinner=False)
+def configure_genai(api_key):
+    """Configures the Gemini client once per process instead of on every rerun."""
+    genai.configure(api_key=api_key)
+    return True
+
+
+@st.cache_resource(show_spinner=False)
+def shared_client():
+    """The process-wide GeminiClient (secrets: GEMINI_SECONDARY_MODEL, GEMINI_DEADLINE)."""
+    configure_genai(st.secrets["GEMINI_API_KEY"])
+    return GeminiClient(secondary=st.secrets.get("GEMINI_SECONDARY_MODEL"),
+                        deadline=st.secrets.get("GEMINI_DEADLINE"))
+
+
+class GeminiClient:
+    """Time-bounded, hedged Gemini calls shared by CoachBrain, AIPlanner and ContextMemory.
+
+    Every call has a deadline. If the first answer hasn't arrived after the model's
+    recent p95 latency (time to first chunk for streams), a duplicate request goes
+    out to `secondary` (or the same model) and whichever answers first wins; the
+    loser's reply is dropped. A primary that fails outright falls back to
+    `secondary` straight away. Latencies are kept per model for stats().
+    """
+
+    DEADLINE = 60         # seconds per call
+    HEDGE_DEFAULT = 8.0   # hedge delay until a model has MIN_SAMPLES latencies
+    HEDGE_MIN = 1.0
+    HEDGE_MAX = 20.0
+    MIN_SAMPLES = 20
+    WINDOW = 200          # latencies kept per (model, kind)
+    WORKERS = 8
+
+    def __init__(self, secondary=None, deadline=None, hedge=True):
+        self.secondary = secondary
+        self.deadline = float(deadline or self.DEADLINE)
+        self.hedge = hedge
+        self._pool = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="gemini")
+        self._lock = threading.Lock()
+        self._latency = {}  # (model, kind) -> deque of seconds
+        self._counts = {}   # model -> Counter over COUNTERS
+
+    # --- STATS ---
+    def _record(self, model, kind, seconds):
+        with self._lock:
+            self._latency.setdefault((model, kind), collections.deque(maxlen=self.WINDOW)).append(seconds)
+
+    def _count(self, model, field):
+        with self._lock:
+            self._counts.setdefault(model, collections.Counter())[field] += 1
+
+    def hedge_delay(self, model, kind="generate"):
+        """Seconds to wait before hedging: the recent p95, clamped to [HEDGE_MIN, HEDGE_MAX]."""
+        with self._lock:
+            samples = list(self._latency.get((model, kind), ()))
+        if len(samples) < self.MIN_SAMPLES:
+            return self.HEDGE_DEFAULT
+        return min(max(float(np.percentile(samples, 95)), self.HEDGE_MIN), self.HEDGE_MAX)
+
+    def stats(self):
+        """One row per (model, kind) with p50/p95/p99/max seconds and the model's call counters."""
+        with self._lock:
+            latency = {k: list(v) for k, v in self._latency.items()}
+            counts = {k: dict(v) for k, v in self._counts.items()}
+        rows = []
+        for (model, kind), samples in sorted(latency.items()):
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            rows.append({"model": model, "kind": kind, "samples": len(samples),
+                         "p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2),
+                         "max": round(max(samples), 2),
+                         **{k: counts.get(model, {}).get(k, 0) for k in COUNTERS}})
+        return rows
+
+    # --- GENERATE ---
+    def generate(self, prompt, model, deadline=None, label="generate"):
+        """Reply text for `prompt`, from `model` or its hedge. Raises TimeoutError past the deadline."""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        self._count(model, "calls")
+        pending = {}
+
+        def launch(name, hedged):
+            future = self._pool.submit(tracing.propagate(self._attempt), prompt, name, label, hedged, deadline_at)
+            pending[future] = (name, hedged)
+
+        launch(model, False)
+        hedge_at = time.monotonic() + self.hedge_delay(model) if self.hedge else None
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline_at:
+                self._count(model, "timeouts")
+                raise TimeoutError(f"Gemini ({model}) gave no answer within {deadline or self.deadline:g}s")
+            until = deadline_at if hedge_at is None else min(hedge_at, deadline_at)
+            done, _ = wait(list(pending), timeout=until - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, hedged = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    error = e
+                    self._count(name, "errors")
+                    continue
+                if hedged:
+                    self._count(model, "hedge_wins")
+                return text
+            # Slow primary: hedge. Failed primary: fall back, if there is somewhere to go.
+            if hedge_at is not None and (time.monotonic() >= hedge_at or (not pending and self.secondary)):
+                hedge_at = None
+                self._count(model, "hedged")
+                launch(self.secondary or model, True)
+        raise error
+
+    def _attempt(self, prompt, model, label, hedged, deadline_at):
+        started = time.monotonic()
+        with tracing.span("gemini", label, model=model, hedge=hedged):
+            response = genai.GenerativeModel(model).generate_content(
+                prompt, request_options={"timeout": max(deadline_at - started, 1)})
+            text = response.text  # ValueError when the reply was blocked / has no parts
+            if not text.strip():
+                raise ValueError("empty reply")
+        self._record(model, "generate", time.monotonic() - started)
+        return text
+
+    # --- STREAM ---
+    def stream(self, prompt, model, deadline=None, label="stream"):
+        """Yields reply chunks. Hedging races on the first chunk; after that only the winner streams."""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        self._count(model, "calls")
+        out = queue.Queue()
+        attempts = []  # [model, hedged, stop flag]
+
+        def launch(name, hedged):
+            attempts.append([name, hedged, False])
+            self._pool.submit(tracing.propagate(self._stream_attempt), len(attempts) - 1, attempts,
+                              prompt, label, out, deadline_at)
+
+        launch(model, False)
+        hedge_at = time.monotonic() + self.hedge_delay(model, "first_chunk") if self.hedge else None
+        winner, failed = None, 0
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline_at:
+                    self._count(model, "timeouts")
+                    raise TimeoutError(f"Gemini ({model}) gave no answer within {deadline or self.deadline:g}s")
+                until = deadline_at if winner is not None or hedge_at is None else min(hedge_at, deadline_at)
+                try:
+                    i, item = out.get(timeout=until - now)
+                except queue.Empty:
+                    if winner is None and hedge_at is not None and time.monotonic() >= hedge_at:
+                        hedge_at = None
+                        self._count(model, "hedged")
+                        launch(self.secondary or model, True)
+                    continue
+                if winner is not None and i != winner:
+                    continue  # the loser's output
+                if isinstance(item, Exception):
+                    self._count(attempts[i][0], "errors")
+                    failed += 1
+                    if winner is None and hedge_at is not None and self.secondary:
+                        hedge_at = None
+                        self._count(model, "hedged")
+                        launch(self.secondary, True)
+                    elif winner is not None or failed == len(attempts):
+                        raise item
+                    continue
+                if winner is None:
+                    winner = i
+                    for j, attempt in enumerate(attempts):
+                        attempt[2] = j != i  # stop everyone else
+                    if attempts[i][1]:
+                        self._count(model, "hedge_wins")
+                if item is _END:
+                    return
+                yield item
+        finally:
+            for attempt in attempts:
+                attempt[2] = True
+
+    def _stream_attempt(self, i, attempts, prompt, label, out, deadline_at):
+        model, hedged, _ = attempts[i]
+        started = time.monotonic()
+        try:
+            with tracing.span("gemini", label, model=model, hedge=hedged) as span:
+                # The stop flag is only seen between chunks: a stalled stream must time out on
+                # its own, or it holds one of the shared WORKERS until the socket gives up
+                response = genai.GenerativeModel(model).generate_content(
+                    prompt, stream=True, request_options={"timeout": max(deadline_at - started, 1)})
+                for chunk in response:
+                    if attempts[i][2]:
+                        span.attrs["stopped"] = True
+                        return
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue  # chunk without text parts (e.g. finish marker)
+                    if text:
+                        if "first_chunk_ms" not in span.attrs:
+                            self._record(model, "first_chunk", time.monotonic() - started)
+                            span.attrs["first_chunk_ms"] = round(span.ms, 1)
+                        out.put((i, text))
+            self._record(model, "stream", time.monotonic() - started)
+            out.put((i, _END))
+        except Exception as e:
+            out.put((i, e))
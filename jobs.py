@@ -0,0 +1,152 @@
+import inspect
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+
+FINISHED = ("done", "failed", "cancelled", "timeout")
+
+
+class Job:
+    """One submitted LLM request. Poll `status`/`text()`; generator jobs fill `chunks` as they stream."""
+
+    def __init__(self, key, label, time_limit):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.label = label
+        self.created = time.monotonic()
+        self.deadline = self.created + time_limit if time_limit else None
+        self.started = None
+        self.ended = None
+        self.chunks = []
+        self.result = None
+        self.error = None
+        self._status = "queued"
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def status(self):
+        # Threads can't be killed: a job past its deadline is reported (and discarded) as timed out
+        if self.deadline and not self._done.is_set() and time.monotonic() > self.deadline:
+            self._finish("timeout", error=TimeoutError(f"{self.label} took longer than "
+                                                       f"{self.deadline - self.created:g}s"))
+        return self._status
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def text(self):
+        """Everything produced so far (the full reply once done)."""
+        if self._status == "done" and isinstance(self.result, str):
+            return self.result
+        return "".join(self.chunks)
+
+    def elapsed(self):
+        return (self.ended or time.monotonic()) - self.created
+
+    def wait(self, timeout=None):
+        """Blocks until the job finishes (or `timeout` passes); returns the final status."""
+        if self.deadline:
+            remaining = max(self.deadline - time.monotonic(), 0)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._done.wait(timeout)
+        return self.status
+
+    def cancel(self):
+        """Stops a queued job from starting and a streaming one at its next chunk."""
+        return self._finish("cancelled")
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if self._status in FINISHED:
+                return False  # late results of a cancelled/timed-out job are dropped
+            self._status, self.result, self.error = status, result, error
+            self.ended = time.monotonic()
+        self._done.set()
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._status != "queued":
+                return False
+            self._status = "running"
+            self.started = time.monotonic()
+            return True
+
+
+class JobPool:
+    """Process-wide worker pool for slow LLM calls, shared by every session.
+
+    submit() returns at once with a Job; the Streamlit script polls it on later
+    reruns instead of blocking. Submitting a key that is already queued or
+    running returns the existing job, so double-clicks don't double-spend.
+    Finished jobs stay retrievable by id for `KEEP` seconds.
+    """
+
+    WORKERS = 4
+    TIME_LIMIT = 90   # seconds from submission
+    KEEP = 300
+
+    def __init__(self, workers=None, time_limit=None):
+        self.time_limit = time_limit or self.TIME_LIMIT
+        # Not a "coach-" name: Sheets reads made by a job are interactive (see scheduler)
+        self._pool = ThreadPoolExecutor(max_workers=workers or self.WORKERS, thread_name_prefix="coachjob")
+        self._lock = threading.Lock()
+        self._jobs = {}     # id -> Job
+        self._active = {}   # key -> Job still queued or running
+
+    def submit(self, key, fn, *args, label=None, time_limit=None, **kwargs):
+        """Runs fn(*args, **kwargs) on a worker. A generator's items are collected as `chunks`."""
+        with self._lock:
+            self._forget_old()
+            job = self._active.get(key)
+            if job is not None and not job.finished:
+                return job
+            job = Job(key, label or str(key[0] if isinstance(key, tuple) else key), time_limit or self.time_limit)
+            self._jobs[job.id] = self._active[key] = job
+        # Spans recorded by the job land in the trace of the rerun that submitted it
+        self._pool.submit(tracing.propagate(self._work), job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.cancel() if job else False
+
+    def active(self):
+        with self._lock:
+            return [j for j in self._active.values() if not j.finished]
+
+    def _forget_old(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.ended and now - job.ended > self.KEEP:
+                del self._jobs[job_id]
+        self._active = {k: j for k, j in self._active.items() if not j.finished}
+
+    def _work(self, job, fn, args, kwargs):
+        if not job._start():
+            return  # cancelled (or expired) while queued
+        try:
+            out = fn(*args, **kwargs)
+            if inspect.isgenerator(out):
+                try:
+                    for chunk in out:
+                        if job.finished:
+                            break
+                        job.chunks.append(str(chunk))
+                finally:
+                    out.close()
+                out = "".join(job.chunks)
+            job._finish("done", result=out)
+        except Exception as e:
+            job._finish("failed", error=e)
+        finally:
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
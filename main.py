@@ -1,9 +1,17 @@
 import streamlit as st
+import datetime
+import uuid
 import pandas as pd
 import altair as alt
-import time
-from database import CoachDB
+from database import CoachDB, BatchWriteError
 from brain import CoachBrain
+from coach_db import SuperCoachDB
+from replica import REPLICA_FILE, SheetsReplica
+from storage import configured_backend, open_storage
+from analytics import Analytics
+from snapshot import ColumnarSnapshot
+from jobs import JobPool
+import tracing
 
 # --- CONFIG ---
 st.set_page_config(page_title="Aditya's HQ", page_icon="⚡", layout="wide")
@@ -34,9 +42,75 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize
-db = CoachDB()
-brain = CoachBrain(db)
+# --- TRACING (every Sheets/Gemini call made during this rerun is recorded in `trace`) ---
+@st.cache_resource(show_spinner=False)
+def configure_tracing():
+    # Optional span log for offline analysis: trace_file + trace_format ("jsonl" or "otel")
+    if st.secrets.get("trace_file"):
+        tracing.export_to(st.secrets["trace_file"], st.secrets.get("trace_format", "jsonl"))
+    return True
+
+configure_tracing()
+# Recent reruns of this session, newest last; the Diagnostics panel shows the finished ones
+traces = st.session_state.setdefault("traces", [])
+trace = tracing.begin("main.py")
+traces[:] = traces[-9:] + [trace]
+
+# Initialize (once per process; every rerun and session shares the same connection)
+@st.cache_resource(show_spinner=False)
+def get_db():
+    backend = configured_backend("sheets")
+    if backend == "sheets":
+        # Writes are journaled to coach_outbox.db and sent to Sheets in the background
+        db = open_storage(backend, cache_ttl=st.secrets.get("sheets_cache_ttl"), outbox_path="coach_outbox.db")
+        # Daily job moving old log/chat rows into per-month archive tabs
+        if st.secrets.get("compact_after_days"):
+            db.start_compaction(int(st.secrets["compact_after_days"]))
+        return db
+    return open_storage(backend)
+
+@st.cache_resource(show_spinner=False)
+def get_brain(_db):
+    return CoachBrain(_db)
+
+@st.cache_resource(show_spinner=False)
+def get_replica(_db):
+    if not isinstance(_db, CoachDB):
+        return None  # Already local, nothing to mirror
+    # Local SQLite mirror of the sheet for dashboard/history queries
+    replica = SheetsReplica(_db, SuperCoachDB(REPLICA_FILE))
+    replica.start()
+    return replica
+
+@st.cache_resource(show_spinner=False)
+def get_analytics(_db):
+    # Built from the full history once, then updated on every log_metric
+    analytics = Analytics.from_storage(_db)
+    _db.add_listener(analytics.add)
+    return analytics
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot(_db):
+    # Memory-mapped columnar copy of the logs for charts, refreshed in the background
+    snapshot = ColumnarSnapshot(_db, "coach_snapshot")
+    snapshot.start()
+    return snapshot
+
+@st.cache_resource(show_spinner=False)
+def get_jobs():
+    # Gemini work runs here, shared by every session, so a slow reply never blocks a rerun
+    return JobPool()
+
+db = get_db()
+brain = get_brain(db)
+replica = get_replica(db)
+store = replica.reader() if replica else db  # SQLite once the first pull lands, Sheets until then
+
+# Fetch everything the sidebar needs up front, in parallel
+COMMANDER = "🤖 Commander"
+in_commander = st.session_state.get("mode", COMMANDER) == COMMANDER
+sidebar = db.load_sidebar(commander=in_commander,
+                          include_chat=in_commander and "messages" not in st.session_state)
 
 # --- SIDEBAR (NAVIGATION & REMINDERS) ---
 with st.sidebar:
@@ -44,7 +118,7 @@ with st.sidebar:
     
     # 🚨 MORNING CHECKLIST (The Non-Blocking Nudge) 🚨
     st.divider()
-    if not db.is_weight_logged_today():
+    if not sidebar.weight_logged:
         st.warning("⚠️ WEIGHT NOT LOGGED")
         st.caption("Please log before swimming.")
         
@@ -52,8 +126,7 @@ with st.sidebar:
         w = st.number_input("Weight (kg)", min_value=50.0, max_value=120.0, step=0.1, key="weight_sidebar")
         if st.button("Log Weight", key="btn_weight_sidebar"):
             db.log_metric("Weight", w)
-            st.success("Logged!")
-            time.sleep(1)
+            st.toast("Logged!")
             st.rerun()
     else:
         st.success("✅ Weight Logged Today")
@@ -61,12 +134,12 @@ with st.sidebar:
     st.divider()
     
     # Mode Selection
-    mode = st.radio("Mode", ["🤖 Commander", "📊 Dashboard", "📜 History"])
+    mode = st.radio("Mode", [COMMANDER, "📊 Dashboard", "📜 History"], key="mode")
     st.divider()
 
     st.divider()
     st.subheader("🔧 Diagnostics")
-    if st.button("🔴 Test Database Connection"):
+    if isinstance(db, CoachDB) and st.button("🔴 Test Database Connection"):
         try:
             # 1. Try to READ
             st.write("1. Attempting to READ...")
@@ -75,10 +148,10 @@ with st.sidebar:
             
             # 2. Try to WRITE
             st.write("2. Attempting to WRITE...")
-            import datetime
             now = datetime.datetime.now().strftime("%H:%M:%S")
             # Appending to 'chat_history' is safest for testing
             db.ws_chat.append_row([now, "SYSTEM", "Test Connection Successful"])
+            db.invalidate("chat_history")
             st.success(f"✅ Write Success! Added row at {now}")
             
         except Exception as e:
@@ -86,23 +159,123 @@ with st.sidebar:
             st.write("Double check: Is the Service Account Email added as EDITOR in the Google Sheet?")
     st.divider()
     st.subheader("🔧 Diagnostics")
-    if st.button("🔴 Test Food Log Specifically"):
+    if isinstance(db, CoachDB) and st.button("🔴 Test Food Log Specifically"):
         try:
             st.write("Targeting 'food_logs' tab...")
             # 1. Check if tab exists
             db.ws_food.append_row(["TEST_DATE", "TEST_TIME", "Connection Verified"])
+            db.invalidate("food_logs")
             st.success("✅ Success! Check your Google Sheet 'food_logs' tab now.")
         except Exception as e:
             st.error(f"❌ WRITE FAILED: {e}")
             st.write("Possible fix: Check if tab name is exactly 'food_logs' (lowercase).")
+    # Writes waiting in the local outbox for the background flusher
+    depth = db.queue_depth()
+    st.caption(f"📤 Pending writes: {depth}")
+    if get_snapshot(db).last_error:
+        st.caption(f"⚠️ Snapshot error: {get_snapshot(db).last_error}")
+    if replica and replica.last_error:
+        st.caption(f"⚠️ Replica sync error: {replica.last_error}")
+    if depth and db.sync_error():
+        st.caption(f"⚠️ Last sync error: {db.sync_error()}")
+    # Writes the outbox gave up on; they never reached Sheets
+    dead = db.dead_letters()
+    if dead:
+        with st.expander(f"☠️ Failed writes: {len(dead)}"):
+            st.dataframe(pd.DataFrame(
+                [{"worksheet": ws, "kind": kind, "values": str(values), "attempts": attempts, "error": error,
+                  "queued": datetime.datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M")}
+                 for _, kind, ws, values, attempts, error, created in dead]),
+                hide_index=True, use_container_width=True)
+    finished = [t for t in traces[:-1] if t.spans]
+    if finished:
+        with st.expander("⏱️ Rerun Timings"):
+            # Options are keyed by start time: a trace's totals keep growing while its jobs finish
+            by_clock = {t.clock: t for t in finished}
+            picked = by_clock[st.selectbox("Rerun", list(by_clock), index=len(by_clock) - 1)]
+            st.caption(f"{picked.ms:.0f} ms, {len(picked.spans)} calls")
+            spans = pd.DataFrame(picked.rows())
+            spans['end_ms'] = spans['start_ms'] + spans['ms']
+            waterfall = alt.Chart(spans).mark_bar().encode(
+                x=alt.X('start_ms:Q', title='ms'), x2='end_ms:Q',
+                y=alt.Y('span:N', sort=None, axis=None),
+                color=alt.Color('kind:N', legend=alt.Legend(orient='bottom', title=None)),
+                tooltip=['kind', 'name', 'worksheet', 'ms', 'rows', 'bytes', 'cache', 'retries', 'error']
+            ).properties(height=max(60, 14 * len(spans)))
+            st.altair_chart(waterfall, use_container_width=True)
+            shown = [c for c in ['kind', 'name', 'worksheet', 'model', 'start_ms', 'ms', 'rows', 'bytes',
+                                 'cache', 'retries', 'error'] if c in spans]
+            st.dataframe(spans[shown], hide_index=True, use_container_width=True)
+    # Tail latency per model; hedged requests kick in past each model's p95
+    gemini_stats = brain.client.stats()
+    if gemini_stats:
+        with st.expander("🤖 Gemini Latency"):
+            st.dataframe(pd.DataFrame(gemini_stats), hide_index=True, use_container_width=True)
+    if isinstance(db, CoachDB):
+        quota = db.conn.scheduler.summary()
+        st.caption(f"📶 Sheets requests: {quota['requests']} · throttled {quota['throttled']} · "
+                   f"retried {quota['retries']} · shared {quota['coalesced']}")
+        if db.compact_error:
+            st.caption(f"⚠️ Compaction error: {db.compact_error}")
+        if st.button("🗜️ Archive Old Rows"):
+            archived = db.compact()
+            st.success(" · ".join(f"{name}: {n} rows archived" for name, n in archived.items()))
+    if isinstance(db, CoachDB) and st.button("🔄 Reload from Sheets"):
+        # Drop cached worksheets (e.g. after editing the sheet by hand)
+        db.invalidate()
+        get_analytics(db).load(db.get_goals(), db.get_raw_history())
+        st.rerun()
+
+# --- CHAT JOBS ---
+def chat_turn(prompt):
+    """Job body for one chat turn. Nothing holds the write lock while Gemini streams:
+    parsed logs are written in their own short batch (brain.execute) before any model
+    call, and the reply (or what arrived before a stop) is saved once the stream ends."""
+    chunks = []
+    try:
+        for chunk in brain.process_input(prompt, stream=True):
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        if chunks:
+            db.log_chat("assistant", "".join(chunks))
+
+def reply_text(job):
+    text = job.text()
+    if job.status == "cancelled":
+        return text + "\n\n_(stopped)_"
+    if job.status == "timeout":
+        return text + "\n\n⚠️ The coach took too long to answer. Try again?"
+    if isinstance(job.error, BatchWriteError):
+        return "\n".join(f"❌ Not saved to '{r.worksheet}': {r.values} ({r.error})"
+                         for r in job.error.results if not r.ok)
+    if job.error is not None:
+        return f"⚠️ {job.error}"
+    return text
+
+@st.fragment(run_every=0.5)
+def pending_replies():
+    """Streams in-flight replies into their bubbles; a finished one triggers a full rerun."""
+    jobs = st.session_state.get("chat_jobs", [])
+    for job in jobs:
+        with st.chat_message("assistant"):
+            st.markdown(job.text() or "⏳ _Thinking..._")
+            if not job.finished:
+                st.button("⏹️ Stop", key=f"stop_{job.id}", on_click=job.cancel)
+    done = [job for job in jobs if job.finished]
+    if done:
+        for job in done:
+            st.session_state.messages.append({"role": "assistant", "content": reply_text(job)})
+        st.session_state.chat_jobs = [job for job in jobs if not job.finished]
+        st.rerun()  # Refresh the sidebar stats/orders the turn may have changed
 
 # ==========================================
 # MODE 1: COMMANDER (Chat)
 # ==========================================
-if mode == "🤖 Commander":
+if mode == COMMANDER:
     with st.sidebar:
         st.subheader("📅 Orders")
-        schedule = db.get_full_schedule()
+        schedule = sidebar.schedule
         if not schedule:
             st.info("No plan. Type 'Plan my day'.")
         else:
@@ -116,7 +289,7 @@ if mode == "🤖 Commander":
         
         st.divider()
         st.subheader("📊 Today's Stats")
-        stats = db.get_progress()
+        stats = sidebar.progress
         for name, target, unit, value, rpe in stats:
             pct = min(value / target, 1.0) if target > 0 else 0
             st.write(f"**{name}**")
@@ -127,25 +300,40 @@ if mode == "🤖 Commander":
     st.header("🤖 Coach Uplink")
     if "messages" not in st.session_state:
         st.session_state.messages = []
-        history = db.get_chat_history(10)
+        if sidebar.chat is not None:
+            history, st.session_state.chat_cursor = sidebar.chat, sidebar.chat_cursor
+        else:
+            history, st.session_state.chat_cursor = db.get_chat_page(limit=10)
         for sender, msg in history:
             st.session_state.messages.append({"role": sender, "content": msg})
 
+    # Page backwards through the log without downloading all of it
+    if st.session_state.get("chat_cursor", 2) > 2:
+        if st.button("⬆️ Load older messages"):
+            older, st.session_state.chat_cursor = db.get_chat_page(
+                before_row=st.session_state.chat_cursor, limit=10)
+            st.session_state.messages = [
+                {"role": sender, "content": msg} for sender, msg in older
+            ] + st.session_state.messages
+            st.rerun()
+
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
+    # Only poll while a reply is outstanding; the rerun after the last one lands stops it
+    if st.session_state.get("chat_jobs"):
+        pending_replies()
+
     if prompt := st.chat_input("Enter command..."):
         st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-        db.log_chat("user", prompt)
-
-        response = brain.process_input(prompt)
-        st.session_state.messages.append({"role": "assistant", "content": response})
-        with st.chat_message("assistant"):
-            st.markdown(response)
-        db.log_chat("assistant", response)
+        db.log_chat("user", prompt)  # Saved now, not held until the reply is done
+        # Every message gets its own job (a repeat is a new turn, not a duplicate); the
+        # session in the key keeps jobs from different sessions apart in the shared pool
+        session = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+        st.session_state.chat_seq = st.session_state.get("chat_seq", 0) + 1
+        job = get_jobs().submit(("chat", session, st.session_state.chat_seq), chat_turn, prompt, label="reply")
+        st.session_state.setdefault("chat_jobs", []).append(job)
         st.rerun()
 
 # ==========================================
@@ -153,13 +341,59 @@ if mode == "🤖 Commander":
 # ==========================================
 elif mode == "📊 Dashboard":
     st.title("📊 Performance Analytics")
-    
+    analytics = get_analytics(db)
+
+    # Streaks & Records (kept up to date incrementally, no history scan)
+    st.subheader("🏆 Streaks & Records")
+    st.metric("Today's Completion", f"{analytics.completion():.0%}")
+    summary = analytics.summary()
+    if not summary.empty:
+        cols = st.columns(4)
+        for i, row in enumerate(summary.itertuples()):
+            with cols[i % 4]:
+                st.metric(row.goal, f"🔥 {row.current_streak}d",
+                          help=f"Longest streak: {row.longest_streak}d")
+        st.dataframe(
+            summary,
+            use_container_width=True,
+            column_config={
+                "goal": "Goal",
+                "current_streak": st.column_config.NumberColumn("Streak", format="%d 🔥"),
+                "longest_streak": st.column_config.NumberColumn("Best Streak", format="%d"),
+                "record": st.column_config.NumberColumn("PR (day)"),
+                "record_date": st.column_config.DateColumn("PR Date", format="DD MMM YYYY"),
+                "avg_7d": st.column_config.NumberColumn("7d Avg", format="%.1f"),
+                "avg_30d": st.column_config.NumberColumn("30d Avg", format="%.1f"),
+            },
+            hide_index=True
+        )
+        if isinstance(store, SuperCoachDB):
+            # Materialized per-day rollups; days without a write count as 0%
+            done = pd.DataFrame(store.get_completion_history(30), columns=['date', 'completion'])
+            done['date'] = pd.to_datetime(done['date'], errors='coerce')
+            df_done = pd.DataFrame({'date': pd.date_range(end=pd.Timestamp.today().normalize(), periods=30)})
+            df_done = df_done.merge(done, on='date', how='left').fillna({'completion': 0})
+        else:
+            df_done = analytics.completion_history(30)
+        completion = alt.Chart(df_done).mark_bar().encode(
+            x=alt.X('date:T', title='Date'),
+            y=alt.Y('completion:Q', title='Goals Met', axis=alt.Axis(format='%'), scale=alt.Scale(domain=[0, 1])),
+            tooltip=['date', alt.Tooltip('completion:Q', format='.0%')]
+        ).properties(height=150)
+        st.altair_chart(completion, use_container_width=True)
+
+    st.divider()
+
     # Consistency Heatmap
     st.subheader("🔥 Consistency Streak")
-    cons_data = db.get_consistency_data()
-    if cons_data:
-        df_cons = pd.DataFrame(cons_data, columns=['date', 'count'])
+    snapshot = get_snapshot(db)
+    if not isinstance(store, SuperCoachDB) and snapshot.ready():
+        df_cons = snapshot.daily_counts()  # Off the memory map instead of a full Sheets scan
+    else:
+        # SQLite keeps per-day entry counts materialized (day_rollups)
+        df_cons = pd.DataFrame(store.get_consistency_data(), columns=['date', 'count'])
         df_cons['date'] = pd.to_datetime(df_cons['date'])
+    if not df_cons.empty:
         heatmap = alt.Chart(df_cons).mark_rect().encode(
             x=alt.X('date:O', timeUnit='yearmonthdate', title='Date'),
             y=alt.Y('count:Q', title='Tasks'),
@@ -172,13 +406,29 @@ elif mode == "📊 Dashboard":
     
     # Metric Trends
     st.subheader("📈 Metric Trends")
-    all_goals = db.get_all_goal_names()
+    all_goals = db.get_all_goal_names()  # tiny and cached; the replica also holds app.py goals
     metric = st.selectbox("Select Metric:", all_goals)
-    if metric:
-        history = db.get_metric_history(metric)
-        if history:
-            df_hist = pd.DataFrame(history, columns=['date', 'value'])
-            df_hist['date'] = pd.to_datetime(df_hist['date'])
+    # SQLite keeps weekly/monthly totals materialized (goal_rollups)
+    period = "Day"
+    if isinstance(store, SuperCoachDB):
+        period = st.radio("Per", ["Day", "Week", "Month"], horizontal=True, key="trend_period")
+    if metric and period != "Day":
+        df_hist = pd.DataFrame(store.get_goal_totals(metric, period.lower()), columns=['date', 'value', 'days'])
+        df_hist['date'] = pd.to_datetime(df_hist['date'], errors='coerce')
+        if not df_hist.empty:
+            chart = alt.Chart(df_hist).mark_bar().encode(
+                x=alt.X('date:T', title=f'{period} of'), y=alt.Y('value:Q', title='Total'),
+                tooltip=['date', 'value', alt.Tooltip('days:Q', title='Days logged')]
+            ).properties(height=400)
+            st.altair_chart(chart, use_container_width=True)
+    elif metric:
+        snapshot = get_snapshot(db)
+        if snapshot.ready():
+            df_hist = snapshot.metric_history(metric)  # Typed columns straight off the memory map
+        else:
+            df_hist = pd.DataFrame(store.get_metric_history(metric), columns=['date', 'value'])
+            df_hist['date'] = pd.to_datetime(df_hist['date'], errors='coerce')
+        if not df_hist.empty:
             chart = alt.Chart(df_hist).mark_line(point=True).encode(
                 x='date:T', y='value:Q', tooltip=['date', 'value']
             ).properties(height=400)
@@ -190,34 +440,42 @@ elif mode == "📊 Dashboard":
 elif mode == "📜 History":
     st.title("📜 Raw Logbook")
     
-    raw_data = db.get_raw_history()
-    if raw_data:
-        df = pd.DataFrame(raw_data)
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            # Get unique goal names for the filter
-            options = df['goal_name'].unique().tolist()
-            selected_metrics = st.multiselect("Filter by Metric", options)
-        
-        # Apply Filter
-        if selected_metrics:
-            df = df[df['goal_name'].isin(selected_metrics)]
-            
-        # Sort by Date (Newest First)
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values(by='date', ascending=False)
-            
-            st.dataframe(
-                df, 
-                use_container_width=True,
-                column_config={
-                    "date": st.column_config.DateColumn("Date", format="DD MMM YYYY"),
-                    "value": st.column_config.NumberColumn("Value"),
-                    "rpe": "RPE / Notes"
-                },
-                hide_index=True
-            )
+    col1, col2 = st.columns(2)
+    with col1:
+        # Every goal with log rows, including ones no longer on the goals tab
+        selected_metrics = st.multiselect("Filter by Metric", store.get_logged_goal_names())
+    with col2:
+        date_range = st.date_input("Date Range", value=(), format="DD/MM/YYYY")
+    start = date_range[0] if len(date_range) > 0 else None
+    end = date_range[1] if len(date_range) > 1 else start
+
+    # Only the visible page is fetched; filtering and sorting happen in the store
+    PAGE_SIZE = 50
+    page = st.session_state.get("history_page", 1)
+    rows, total = store.get_history_page(selected_metrics, start, end, page - 1, PAGE_SIZE)
+    pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    if page > pages:
+        # Filters shrank the result set: jump back to the last page
+        st.session_state["history_page"] = page = pages
+        rows, total = store.get_history_page(selected_metrics, start, end, page - 1, PAGE_SIZE)
+
+    if rows:
+        df = pd.DataFrame(rows)
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        st.dataframe(
+            df, 
+            use_container_width=True,
+            column_config={
+                "date": st.column_config.DateColumn("Date", format="DD MMM YYYY"),
+                "value": st.column_config.NumberColumn("Value"),
+                "rpe": "RPE / Notes"
+            },
+            hide_index=True
+        )
+        first = (page - 1) * PAGE_SIZE
+        st.caption(f"Rows {first + 1}–{first + len(rows)} of {total}")
+        st.number_input("Page", min_value=1, max_value=pages, step=1, key="history_page")
     else:
-        st.info("No logs found yet.")
\ No newline at end of file
+        st.info("No logs found yet.")
+
+trace.finish()
@@ -1,6 +1,6 @@
 import os
-from google import genai
 import streamlit as st
+from gemini import shared_client
 
 try:
     API_KEY = st.secrets["GEMINI_API_KEY"]
@@ -9,7 +9,7 @@ except:
     st.error("❌ API Key missing! Set it in .streamlit/secrets.toml or Streamlit Cloud Secrets.")
     st.stop()
 
-client = genai.Client(api_key=API_KEY)
+client = shared_client()  # deadlines + hedging, shared with CoachBrain
 
 class ContextMemory:
     def __init__(self, filename="user_profile.md"):
@@ -37,12 +37,10 @@ class ContextMemory:
         """
         
         try:
-            response = client.models.generate_content(
-                model='gemini-3-flash-preview',  # <--- UPDATED HERE
-                contents=prompt
-            )
+            reply = client.generate(prompt, 'gemini-3-flash-preview',  # <--- UPDATED HERE
+                                    deadline=60, label="update_profile")
             
-            new_content = response.text.replace("```markdown", "").replace("```", "").strip()
+            new_content = reply.replace("```markdown", "").replace("```", "").strip()
             with open(self.filename, "w") as f:
                 f.write(new_content)
             return True
@@ -0,0 +1,44 @@
+"""Copies all coach data from one storage backend to another.
+
+    python migrate.py sheets sqlite
+    python migrate.py sqlite sheets --tables goals daily_entries --chunk 1000
+
+Rows are streamed in chunks and appended in bulk (one API call / transaction
+per chunk), so large histories don't need to fit in memory. Goals are never
+duplicated: one that already exists on the target is skipped on Sheets, and on
+SQLite gets the source's target and unit. Everything else is appended, so run it
+against an empty target.
+"""
+import argparse
+import sys
+
+from storage import TABLES, copy_storage, open_storage
+
+
+def _progress(table, copied, total, seconds):
+    rate = copied / seconds if seconds else 0
+    print(f"\r{table}: {copied}/{total} rows ({rate:.0f} rows/s)", end="", file=sys.stderr)
+    if copied >= total:
+        print(file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy Super Coach data between storage backends.")
+    parser.add_argument("source", choices=["sheets", "sqlite"])
+    parser.add_argument("target", choices=["sheets", "sqlite"])
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES))
+    parser.add_argument("--chunk", type=int, default=500, help="rows per read/append call")
+    args = parser.parse_args(argv)
+    if args.source == args.target:
+        parser.error("source and target must differ")
+
+    # No outbox for the Sheets side: a migration should write through and fail loudly
+    source = open_storage(args.source)
+    target = open_storage(args.target)
+    copied = copy_storage(source, target, args.tables, args.chunk, _progress)
+    for table, rows in copied.items():
+        print(f"{table}: {rows} rows copied")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class Outbox:
+    """Durable journal of Sheets writes, drained to the API by a background thread.
+
+    Writes land here first (a local SQLite file), so callers only wait on disk.
+    The worker sends due ops in order via `deliver(ops)`, backing off on failure.
+    Ops that were in flight when the process died are checked with
+    `recover(ops)` before being resent, so a crash doesn't duplicate rows.
+    An op that fails on its own with a non-retryable error, or MAX_ATTEMPTS
+    times, is dead-lettered: kept for inspection but no longer blocking the queue.
+    """
+
+    BATCH_SIZE = 50
+    MAX_BACKOFF = 300  # seconds
+    MAX_ATTEMPTS = 8
+    LINGER = 0.2       # wait a moment after a wake-up so one turn's writes share a batch
+
+    def __init__(self, path="coach_outbox.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._wake = threading.Event()
+        self._thread = None
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS ops
+                                 (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  op_id TEXT UNIQUE,
+                                  kind TEXT,
+                                  worksheet TEXT,
+                                  payload TEXT,
+                                  status TEXT DEFAULT 'pending',
+                                  attempts INTEGER DEFAULT 0,
+                                  next_attempt REAL DEFAULT 0,
+                                  last_error TEXT,
+                                  created_at REAL)''')
+
+    # --- QUEUE ---
+    def enqueue(self, kind, worksheet, values):
+        op_id = uuid.uuid4().hex
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO ops (op_id, kind, worksheet, payload, created_at) VALUES (?,?,?,?,?)",
+                (op_id, kind, worksheet, json.dumps(values), time.time()))
+        self._wake.set()
+        return op_id
+
+    def pending(self, worksheet=None):
+        """Every undelivered op (including in-flight ones) as (seq, kind, worksheet, values)."""
+        query = "SELECT seq, kind, worksheet, payload FROM ops WHERE status != 'dead'"
+        args = ()
+        if worksheet:
+            query += " AND worksheet = ?"
+            args = (worksheet,)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY seq", args).fetchall()
+        return [(seq, kind, ws, json.loads(payload)) for seq, kind, ws, payload in rows]
+
+    def depth(self):
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM ops WHERE status != 'dead'").fetchone()[0]
+
+    def last_error(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT last_error FROM ops WHERE last_error IS NOT NULL AND status != 'dead' "
+                "ORDER BY seq LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def dead_letters(self):
+        """Ops given up on, as (seq, kind, worksheet, values, attempts, last_error, created_at)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, kind, worksheet, payload, attempts, last_error, created_at FROM ops "
+                "WHERE status = 'dead' ORDER BY seq").fetchall()
+        return [(seq, kind, ws, json.loads(payload), attempts, error, created)
+                for seq, kind, ws, payload, attempts, error, created in rows]
+
+    def _take(self):
+        # A head op that already failed goes alone, so one bad write can't block a whole batch
+        now = time.time()
+        with self.lock:
+            head = self.conn.execute(
+                "SELECT attempts, next_attempt FROM ops WHERE status != 'dead' ORDER BY seq LIMIT 1").fetchone()
+            if head is None or head[1] > now:
+                return []
+            limit = 1 if head[0] else self.BATCH_SIZE
+            rows = self.conn.execute(
+                "SELECT seq, kind, worksheet, payload FROM ops WHERE status != 'dead' ORDER BY seq LIMIT ?",
+                (limit,)).fetchall()
+            self.conn.executemany("UPDATE ops SET status = 'sending' WHERE seq = ?", [(r[0],) for r in rows])
+        return [(seq, kind, ws, json.loads(payload)) for seq, kind, ws, payload in rows]
+
+    def _done(self, ops):
+        with self.lock:
+            self.conn.executemany("DELETE FROM ops WHERE seq = ?", [(op[0],) for op in ops])
+
+    def _failed(self, ops, error, retryable=True):
+        """Schedules a retry; returns True if the op was dead-lettered instead."""
+        with self.lock:
+            attempts = self.conn.execute(
+                "SELECT attempts FROM ops WHERE seq = ?", (ops[0][0],)).fetchone()[0] + 1
+            # Only a lone op is known to be the bad one; a failed batch is retried op by op
+            if len(ops) == 1 and (not retryable or attempts >= self.MAX_ATTEMPTS):
+                self.conn.execute("UPDATE ops SET status = 'dead', attempts = ?, last_error = ? WHERE seq = ?",
+                                  (attempts, error, ops[0][0]))
+                return True
+            # Exponential backoff with jitter, capped; a batch rejected outright is split up at once
+            delay = min(2 ** attempts, self.MAX_BACKOFF) * random.uniform(0.5, 1.5) if retryable else 0
+            self.conn.executemany(
+                "UPDATE ops SET status = 'pending', attempts = ?, next_attempt = ?, last_error = ? WHERE seq = ?",
+                [(attempts, time.time() + delay, error, op[0]) for op in ops])
+        return False
+
+    # --- WORKER ---
+    def start(self, deliver, recover, delivered=None, retryable=None, dead=None):
+        """Starts the background flusher (once).
+
+        `deliver(ops)` must raise on failure; `delivered(ops, started_at)` runs after
+        the ops have been removed from the journal. `retryable(error)` says whether
+        a failure is worth retrying (default: always); `dead(ops)` runs when an op
+        is dead-lettered.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(deliver, recover, delivered, retryable, dead),
+                                        name="coach-outbox", daemon=True)
+        self._thread.start()
+
+    def _run(self, deliver, recover, delivered, retryable, dead):
+        # Anything still marked 'sending' was cut off by a crash: resend only if it never landed
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, kind, worksheet, payload FROM ops WHERE status = 'sending' ORDER BY seq").fetchall()
+        in_flight = [(seq, kind, ws, json.loads(payload)) for seq, kind, ws, payload in rows]
+        if in_flight:
+            try:
+                if recover(in_flight):
+                    self._done(in_flight)
+            except Exception:
+                pass  # Can't verify yet; resending is the lesser evil
+
+        while True:
+            ops = self._take()
+            if not ops:
+                self._wake.wait(timeout=5)
+                self._wake.clear()
+                time.sleep(self.LINGER)
+                continue
+            started_at = time.monotonic()
+            try:
+                deliver(ops)
+            except Exception as e:
+                if self._failed(ops, str(e), retryable is None or retryable(e)) and dead is not None:
+                    dead(ops)
+                continue
+            self._done(ops)
+            if delivered is not None:
+                delivered(ops, started_at)
@@ -1,51 +1,154 @@
 import re
 
+# keyword -> goal name. Goal names (and an optional 'aliases' column) from the
+# goals sheet are layered on top of this at runtime.
+DEFAULT_SYNONYMS = {
+    "pullups": "Pullups",
+    "pullup": "Pullups",
+    "pull ups": "Pullups",
+    "pull up": "Pullups",
+    "dips": "Dips",
+    "dip": "Dips",
+    "pushups": "Pushups",
+    "pushup": "Pushups",
+    "push ups": "Pushups",
+    "push up": "Pushups",
+    "dsa": "DSA Problems",
+    "problems": "DSA Problems",
+    "apps": "Job Apps",
+    "plyo": "Plyometrics",
+    "plyometrics": "Plyometrics",
+    "workout": "Workout",
+}
+
+NUMBER = r"\d+(?:\.\d+)?"
+# Optional unit between a number and its goal: "3 hours deep work", "4 sets of dips"
+UNIT = r"(?:(?:x|reps?|sets?(?:\s+of)?|hrs?|hours?(?:\s+of)?|mins?|minutes?(?:\s+of)?)\s*)?"
+
+# Clause separators for multi-command messages: "15 pullups and 20 dips, ate 2 eggs"
+CLAUSE_SPLIT = re.compile(r"\s*(?:[,;&+]|\band\b|\bthen\b|\bplus\b|\balso\b)\s*")
+
+# Clauses that carry no command and shouldn't count against confidence
+FILLER = re.compile(r"^(?:i|just|today|now|just now|this morning|tonight|ok|okay|done|also|too)?$")
+
+# "had" also means "had a meeting"; it only counts as a meal with a meal word nearby
+MEAL_WORD = re.compile(r"\b(?:breakfast|lunch|dinner|snacks?|meal|for\s+(?:breakfast|lunch|dinner))\b")
+
+# A bare "2 kg" is only a weigh-in when it's the whole clause ("72.5kg"), not "lost 2 kg"
+BARE_WEIGHT = re.compile(rf"^(?:{NUMBER})\s*kgs?$")
+
+# Negation, intent/future words and other days: the numbers aren't something done today
+NOT_NOW = re.compile(
+    r"\b(?:no|not|never|dont|don't|didnt|didn't|cant|can't|couldnt|couldn't|wont|won't|skip(?:ped)?"
+    r"|want(?:ed)?|wanna|will|gonna|going|plan(?:ned|ning)?|goal|target|aim(?:ing)?|hope|try(?:ing)?"
+    r"|yesterday|tomorrow|later|next|last|ago|week(?:end)?"
+    r"|monday|tuesday|wednesday|thursday|friday|saturday|sunday"
+    r"|jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b"
+    r"|\b\d{1,4}[/-]\d{1,2}(?:[/-]\d{1,4})?\b|\b\d{1,2}\.\d{1,2}\.\d{2,4}\b"  # 12/03, 2025-03-12, 12.03.25
+)
+
+# Words a log clause may carry besides what the pattern consumed ("i just did 20 pullups today")
+HARMLESS = {
+    "i", "ive", "i've", "just", "did", "do", "done", "got", "log", "logged", "finished", "completed",
+    "complete", "my", "some", "the", "a", "an", "of", "in", "at", "for", "another", "more", "again",
+    "today", "now", "this", "morning", "afternoon", "evening", "tonight", "so", "far", "total",
+    "ok", "okay", "also", "too", "x", "rep", "reps", "set", "sets",
+}
+
+# Anything that reads like a question or a request for advice needs the LLM
+QUESTION = re.compile(r"\?|^(?:how|what|why|when|should|can|could|would|is|am|do|does|help|tell|give|plan|schedule)\b")
+
+
+class ParseResult:
+    def __init__(self, commands, confidence):
+        self.commands = commands
+        self.confidence = confidence
+
+
 class SmartParser:
-    def parse_command(self, text):
-        text = text.lower()
+    def __init__(self, synonyms=None):
+        self.synonyms = dict(DEFAULT_SYNONYMS)
+        for keyword, goal_name in (synonyms or {}).items():
+            self.synonyms[keyword.lower().strip()] = goal_name
+
+        # Longest keyword first so "pull ups" wins over "pull up"; spaces also match '-'
+        keywords = sorted(self.synonyms, key=len, reverse=True)
+        kw = "|".join(re.escape(k).replace(r"\ ", r"[\s-]*") for k in keywords)
+
+        # One precompiled pattern for every command type, tried left to right per clause
+        self._pattern = re.compile(
+            rf"(?P<food>\b(?P<fverb>ate|had|consumed)\s+(?P<item>.+))"
+            # The number must follow the weight word: "weight 72", "weighed in at 71.5kg"
+            rf"|(?P<weight>\b(?:weigh(?:t|ed|ing)?|wt)\b(?:\s*(?:is|was|now|today|in|at|[:=-]))*"
+            rf"\s*(?P<wval>{NUMBER})(?:\s*kgs?\b)?"
+            rf"|(?P<kval>{NUMBER})\s*kgs?\b)"
+            rf"|(?P<metric>(?P<mval>{NUMBER})\s*{UNIT}(?P<mkw>{kw})\b)"
+            rf"|(?P<metric_after>\b(?P<akw>{kw})\s*[:=-]?\s*(?P<aval>{NUMBER})\b)"
+            rf"|(?P<flag>\b(?:did|finished|completed)\s+(?:my\s+|some\s+|the\s+)?(?P<fkw>{kw})\b"
+            rf"|\b(?P<dkw>{kw})\s+(?:done|complete|completed|finished)\b)"
+        )
+        self._kw_lookup = {re.sub(r"[\s-]+", " ", k): v for k, v in self.synonyms.items()}
+
+    def _goal(self, keyword):
+        return self._kw_lookup.get(re.sub(r"[\s-]+", " ", keyword))
+
+    def parse(self, text):
+        """Parses every command in `text`; confidence is the share of clauses understood.
+
+        A clause only counts as understood when the pattern consumed all of it bar
+        HARMLESS words, and it has no negation, intent or other-day words (NOT_NOW).
+        """
+        text = text.lower().strip()
         commands = []
+        clauses = [c for c in CLAUSE_SPLIT.split(text) if not FILLER.match(c)]
+        understood = 0
+
+        for clause in clauses:
+            found = []
+            sure = not NOT_NOW.search(clause)  # False when a match may not be a log at all; the LLM decides
+            rest = clause
+            for m in self._pattern.finditer(clause):
+                rest = rest[:m.start()] + " " * (m.end() - m.start()) + rest[m.end():]
+                if m.group("food"):
+                    if m.group("fverb") == "had" and not MEAL_WORD.search(clause):
+                        sure = False
+                    found.append({
+                        "action": "log_food",
+                        "meal": "Snack/Meal", # Generic meal type for quick logs
+                        "desc": "Quick Log",
+                        "item": m.group("item").strip(),
+                    })
+                elif m.group("weight"):
+                    if m.group("kval") and not BARE_WEIGHT.match(clause):
+                        sure = False
+                    val = float(m.group("wval") or m.group("kval"))
+                    found.append({"action": "log_metric", "goal": "Weight", "value": val})
+                elif m.group("metric"):
+                    found.append({"action": "log_metric", "goal": self._goal(m.group("mkw")),
+                                  "value": float(m.group("mval"))})
+                elif m.group("metric_after"):
+                    found.append({"action": "log_metric", "goal": self._goal(m.group("akw")),
+                                  "value": float(m.group("aval"))})
+                elif m.group("flag"):
+                    # "did dsa" / "plyo done" without a number counts as 1
+                    found.append({"action": "log_metric", "goal": self._goal(m.group("fkw") or m.group("dkw")),
+                                  "value": 1.0})
+
+            if found:
+                leftover = re.findall(r"[a-z']+|\d+(?:\.\d+)?", rest)
+                understood += sure and all(w in HARMLESS for w in leftover)
+                commands.extend(found)
+            elif commands and commands[-1]["action"] == "log_food":
+                # "ate 2 eggs and toast": trailing clauses belong to the meal
+                commands[-1]["item"] += " and " + clause
+                understood += not NOT_NOW.search(clause)
 
-        # --- LOGIC 1: WORKOUTS ---
-        # Patterns: "15 pullups", "20 dips", "did 3 dsa questions"
-        # Regex explanation: Look for a number (\d+) followed by a word
-        workout_patterns = {
-            "pullups": "Pullups",
-            "pull ups": "Pullups",
-            "dips": "Dips",
-            "pushups": "Pushups",
-            "dsa": "DSA Problems",
-            "problems": "DSA Problems",
-            "apps": "Job Apps"
-        }
-
-        for keyword, goal_name in workout_patterns.items():
-            if keyword in text:
-                # Find the number near the keyword
-                match = re.search(r'(\d+)\s*' + keyword, text)
-                if match:
-                    val = float(match.group(1))
-                    commands.append({"action": "log_metric", "goal": goal_name, "value": val})
-                # Handle "did dsa" without number (assume 1)
-                elif "did" in text and keyword in text:
-                     commands.append({"action": "log_metric", "goal": goal_name, "value": 1})
-
-        # --- LOGIC 2: MEALS ---
-        # Patterns: "ate 2 eggs", "had salad"
-        if "ate" in text or "had" in text or "mess" in text:
-            # Everything after "ate/had" is considered the food
-            # This is a simple heuristic
-            food_match = re.search(r'(ate|had|consumed)\s+(.*)', text)
-            if food_match:
-                food_item = food_match.group(2)
-                commands.append({
-                    "action": "log_food", 
-                    "meal": "Snack/Meal", # Generic meal type for quick logs
-                    "desc": "Quick Log", 
-                    "item": food_item
-                })
-
-        # --- LOGIC 3: BOOLEANS ---
-        if "plyo" in text and ("done" in text or "did" in text):
-             commands.append({"action": "log_metric", "goal": "Plyometrics", "value": 1.0})
-
-        return commands
\ No newline at end of file
+        if not clauses or QUESTION.search(text):
+            confidence = 0.0
+        else:
+            confidence = understood / len(clauses)
+        return ParseResult(commands, confidence)
+
+    def parse_command(self, text):
+        return self.parse(text).commands
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from storage import header_columns
+
+
+def _cell(cells, col, default=""):
+    return cells[col] if col is not None and col < len(cells) else default
+
+
+def _number(value):
+    try:
+        return float(value) if value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+# The replica owns its file: a pull may reset and rewrite whole tables, so it must never
+# share one with app.py's own coach_memory.db
+REPLICA_FILE = "coach_replica.db"
+
+
+class SheetsReplica:
+    """Mirrors the Google Sheets data into a local SuperCoachDB (SQLite) file.
+
+    Sheets stays the system of record; the SQLite copy is read-only from the app's
+    point of view and only used for dashboard/history queries. Append-only tabs are
+    pulled incrementally from CoachDB's tail-synced snapshots; goals and schedule
+    are small and copied whole.
+    """
+
+    INTERVAL = 60  # seconds between background pulls
+
+    def __init__(self, sheets_db, local_db, interval=None):
+        self.sheets = sheets_db
+        self.local = local_db
+        self.interval = interval or self.INTERVAL
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # --- SYNC ---
+    def pull(self):
+        """One replication pass over every worksheet."""
+        with self._lock:
+            self._pull_log("daily_entries", self._entry_rows)
+            self._pull_log("food_logs", self._food_rows)
+            self._pull_log("chat_history", self._chat_rows)
+            self._pull_goals()
+            self._pull_schedule()
+
+    def _pull_log(self, name, to_rows):
+        snap = self.sheets._snapshot(name)
+        rows = list(snap.rows)
+        conn = self.local.conn
+        state = conn.execute("SELECT rows, anchor FROM replica_state WHERE worksheet = ?", (name,)).fetchone()
+        done, anchor = state if state else (0, None)
+        # Our newest replicated row must still be in the same place, else start over
+        if done > len(rows) or (done and json.dumps(rows[done - 1]) != anchor):
+            done = 0
+
+        new = rows[done:]
+        if not new and done:
+            return
+        with self.local.batch() as conn:
+            to_rows(conn, header_columns(snap.header), new, first_row=done + 2, reset=done == 0)
+            conn.execute("INSERT OR REPLACE INTO replica_state VALUES (?,?,?,?)",
+                         (name, len(rows), json.dumps(rows[-1]) if rows else None, time.time()))
+
+    def _entry_rows(self, conn, cols, rows, first_row, reset):
+        if reset:
+            # Derived tables go too, or totals for dates no longer in the sheet would linger
+            # and re-added rows would be counted twice; all of it is rebuilt below
+            for table in ("entry_log", "daily_entries", "day_rollups", "goal_rollups"):
+                conn.execute(f"DELETE FROM {table}")
+        # Compacted summary rows carry how many entries they stand for
+        conn.executemany("INSERT OR REPLACE INTO entry_log VALUES (?,?,?,?,?,?)", [
+            (first_row + i, str(_cell(r, cols.get("date"))), _cell(r, cols.get("goal_name")),
+             _number(_cell(r, cols.get("value"))), str(_cell(r, cols.get("rpe"))),
+             int(_number(_cell(r, cols.get("entries"))) or 1))
+            for i, r in enumerate(rows)
+        ])
+        # Keep the per-day totals table (what app.py reads) in step with the raw log
+        conn.execute('''INSERT OR REPLACE INTO daily_entries (date, goal_name, value)
+                        SELECT date, goal_name, SUM(COALESCE(value, 0)) FROM entry_log
+                        WHERE date IN (SELECT DISTINCT date FROM entry_log WHERE row >= ?)
+                        GROUP BY date, goal_name''', (first_row,))
+        touched = conn.execute("SELECT DISTINCT date, goal_name FROM entry_log WHERE row >= ?", (first_row,))
+        self.local.refresh_rollups(None if reset else touched.fetchall())
+
+    def _food_rows(self, conn, cols, rows, first_row, reset):
+        if reset:
+            conn.execute("DELETE FROM food_logs WHERE sheet_row IS NOT NULL")
+        conn.executemany('''INSERT INTO food_logs
+                            (date, meal_type, menu_description, what_i_ate, time, sheet_row)
+                            VALUES (?,?,?,?,?,?)''', [
+            (str(_cell(r, cols.get("date"))), "Snack/Meal", "", str(_cell(r, cols.get("content"), _cell(r, 2))),
+             str(_cell(r, cols.get("time"), _cell(r, 1))), first_row + i)
+            for i, r in enumerate(rows)
+        ])
+
+    def _chat_rows(self, conn, cols, rows, first_row, reset):
+        if reset:
+            conn.execute("DELETE FROM chat_history")
+        # Positional, like CoachDB.get_chat_history
+        conn.executemany("INSERT OR REPLACE INTO chat_history VALUES (?,?,?,?)", [
+            (first_row + i, str(_cell(r, 0)), str(_cell(r, 1)), str(_cell(r, 2)))
+            for i, r in enumerate(rows)
+        ])
+
+    def _pull_goals(self):
+        goals = self.sheets._records("goals")
+        with self.local.batch() as conn:
+            conn.executemany('''INSERT INTO goals (name, target, unit, category) VALUES (?,?,?,?)
+                                ON CONFLICT(name) DO UPDATE SET target = excluded.target,
+                                unit = excluded.unit,
+                                category = COALESCE(NULLIF(excluded.category, 'General'), goals.category)''', [
+                (g['name'], _number(g.get('target', '')) or 0, g.get('unit', ''), g.get('category') or 'General')
+                for g in goals
+            ])
+
+    def _pull_schedule(self):
+        snap = self.sheets._snapshot("schedule")
+        cols = header_columns(snap.header)
+        with self.local.batch() as conn:
+            conn.execute("DELETE FROM schedule")
+            conn.executemany("INSERT INTO schedule VALUES (?,?,?,?,?)", [
+                (i + 2, str(_cell(r, cols.get("date"))), str(_cell(r, cols.get("time_slot"))),
+                 str(_cell(r, cols.get("task"))), str(_cell(r, cols.get("status"))))
+                for i, r in enumerate(snap.rows)
+            ])
+
+    # --- BACKGROUND ---
+    def start(self):
+        """Pulls every `interval` seconds on a daemon thread (once per process)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="coach-replica", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.pull()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            time.sleep(self.interval)
+
+    def synced(self):
+        row = self.local.conn.execute("SELECT COUNT(*) FROM replica_state").fetchone()
+        return row[0] >= 3  # every append-only tab has been pulled at least once
+
+    def reader(self):
+        """The local replica once it has data, otherwise the Sheets-backed CoachDB."""
+        return self.local if self.synced() else self.sheets
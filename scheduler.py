@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+import gspread
+import requests
+
+# Threads doing background work (replica/snapshot pulls, outbox flushes, compaction);
+# everything else is an interactive request from a script run or its read pool.
+BACKGROUND_THREADS = ("coach-", "coachdb-compact")
+
+
+def is_background():
+    return threading.current_thread().name.startswith(BACKGROUND_THREADS)
+
+
+class _Flight:
+    """One in-flight read that identical concurrent reads wait on instead of re-sending."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SheetsScheduler:
+    """Gatekeeper for every Sheets API request made by one service account.
+
+    - Token buckets (one for reads, one for writes) keep us under the per-minute
+      quota instead of finding it through 429s; `burst` requests may go back to back.
+    - Identical reads already in flight are shared (single-flight), so sessions
+      asking for the same worksheet at once cost one request.
+    - 429s and, for reads, 5xx/timeouts are retried with jittered exponential
+      backoff (honouring Retry-After). Writes are only retried on 429, which means
+      the request was rejected outright; anything else may have landed.
+    - While an interactive request is waiting for a token, background threads
+      don't get one.
+    """
+
+    MAX_RETRIES = 5
+    BASE_DELAY = 1.0   # seconds; doubled per attempt, +-50% jitter
+    MAX_DELAY = 32.0
+    RETRY_READ = {429, 500, 502, 503, 504}
+    RETRY_WRITE = {429}
+
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, burst=10):
+        self._cond = threading.Condition()
+        now = time.monotonic()
+        # kind -> [tokens, capacity, tokens per second, last refill]
+        self._buckets = {
+            "read": [float(burst), float(burst), reads_per_minute / 60.0, now],
+            "write": [float(burst), float(burst), writes_per_minute / 60.0, now],
+        }
+        self._waiting = {"read": 0, "write": 0}  # interactive requests waiting for a token
+        self._inflight = {}
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "coalesced": 0}
+
+    # --- ENTRY POINT ---
+    def run(self, fn, kind="read", key=None, span=None):
+        """Runs fn() under the budget. Reads with a `key` are coalesced with identical ones in flight.
+
+        Coalesced callers get the same result object, so it must be treated as read-only.
+        `span` (a tracing.Span) is annotated with queueing, retries and coalescing.
+        """
+        if key is None or kind != "read":
+            return self._execute(fn, kind, span)
+        with self._cond:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            if span is not None:
+                span.cache = "coalesced"
+            return flight.wait()
+        try:
+            flight.result = self._execute(fn, kind, span)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _execute(self, fn, kind, span):
+        for attempt in range(self.MAX_RETRIES + 1):
+            self._acquire(kind, span)
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._retry_delay(e, kind, attempt)
+                if delay is None:
+                    raise
+            with self._cond:
+                self.stats["retries"] += 1
+            if span is not None:
+                span.retries += 1
+            time.sleep(delay)
+
+    # --- TOKEN BUCKETS ---
+    def _acquire(self, kind, span=None):
+        background = is_background()
+        started = time.monotonic()
+        with self._cond:
+            self.stats["requests"] += 1
+            if not background:
+                self._waiting[kind] += 1
+            try:
+                while True:
+                    wait = self._take(kind, background)
+                    if not wait:
+                        break
+                    self._cond.wait(wait)
+            finally:
+                if not background:
+                    self._waiting[kind] -= 1
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.stats["throttled"] += 1
+        if span is not None and waited > 0.001:
+            span.attrs["queued_ms"] = round(span.attrs.get("queued_ms", 0) + waited * 1000, 1)
+
+    def _take(self, kind, background):
+        """Takes a token and returns 0, or returns how long to wait before trying again."""
+        bucket = self._buckets[kind]
+        now = time.monotonic()
+        bucket[0] = min(bucket[1], bucket[0] + (now - bucket[3]) * bucket[2])
+        bucket[3] = now
+        if background and self._waiting[kind]:
+            return 0.05  # an interactive request is queued; let it go first
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self._cond.notify_all()
+            return 0
+        return (1 - bucket[0]) / bucket[2]
+
+    # --- RETRIES ---
+    def _retry_delay(self, error, kind, attempt):
+        """Seconds to wait before retrying `error`, or None if it shouldn't be retried."""
+        if attempt >= self.MAX_RETRIES:
+            return None
+        retry_after = None
+        if isinstance(error, gspread.exceptions.APIError):
+            codes = self.RETRY_READ if kind == "read" else self.RETRY_WRITE
+            if error.code not in codes:
+                return None
+            try:
+                retry_after = float(error.response.headers.get("Retry-After"))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        elif not (kind == "read" and isinstance(error, requests.exceptions.Timeout)):
+            return None
+        delay = min(self.BASE_DELAY * 2 ** attempt, self.MAX_DELAY) * random.uniform(0.5, 1.5)
+        return max(delay, retry_after or 0)
+
+    def summary(self):
+        with self._cond:
+            return dict(self.stats, tokens={k: round(b[0], 1) for k, b in self._buckets.items()},
+                        waiting=dict(self._waiting))
@@ -0,0 +1,272 @@
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# How each canonical column (storage.TABLES) is stored on disk:
+#   date / datetime -> datetime64[D] / datetime64[s] (NaT for unparseable cells)
+#   float           -> float64 (NaN for blanks)
+#   category        -> int32 codes into a per-table dictionary kept in the manifest
+#   text            -> UTF-8 bytes (uint8) + int64 offsets, one pair of files per column
+SCHEMA = {
+    "daily_entries": {"date": "date", "goal_name": "category", "value": "float", "rpe": "text",
+                      "entries": "float"},
+    "food_logs": {"date": "date", "time": "text", "content": "text"},
+    "chat_history": {"timestamp": "datetime", "sender": "category", "message": "text"},
+}
+
+
+def _anchor(row):
+    return json.dumps([str(v) for v in row])
+
+
+class ColumnarSnapshot:
+    """Typed, memory-mapped copy of the append-only tabs for charts and analytics.
+
+    Each table is a list of immutable segments (one directory of .npy column
+    files each) plus a manifest. refresh() only reads rows added since the last
+    export (iter_rows from the stored row count) and writes them as a new
+    segment; small trailing segments are merged by concatenating their arrays.
+    If the newest exported row no longer matches the source (rows deleted or
+    compacted), or the manifest predates a SCHEMA change, the table is rebuilt
+    from scratch. Reads np.load(mmap_mode='r')
+    only the columns they need. Superseded segments are deleted one refresh
+    later, so a reader still walking the previous manifest never loses a file.
+    """
+
+    SEGMENT_ROWS = 65536   # merge trailing segments until they reach this size
+    MAX_SMALL_SEGMENTS = 8
+    CHUNK = 5000           # rows per source read
+    INTERVAL = 60          # seconds between background refreshes
+
+    def __init__(self, source, path="coach_snapshot", interval=None):
+        self.source = source
+        self.path = path
+        self.interval = interval or self.INTERVAL
+        self.last_error = None
+        self._lock = threading.Lock()      # one refresh at a time
+        self._manifests = {}               # table -> manifest, as last read/written
+        self._mapped = {}                  # (table, segment, file) -> memmap
+        self._retired = []                 # (table, segment) superseded by the last refresh
+        self._thread = None
+
+    # --- MANIFEST ---
+    def _dir(self, table, *parts):
+        return os.path.join(self.path, table, *parts)
+
+    def manifest(self, table):
+        manifest = self._manifests.get(table)
+        if manifest is None:
+            try:
+                with open(self._dir(table, "manifest.json")) as f:
+                    manifest = json.load(f)
+            except (FileNotFoundError, ValueError):
+                manifest = self._empty(table)
+            self._manifests[table] = manifest
+        return manifest
+
+    @staticmethod
+    def _empty(table):
+        return {"rows": 0, "segments": [], "anchor": None, "columns": list(SCHEMA[table]),
+                "dictionaries": {c: [] for c, kind in SCHEMA[table].items() if kind == "category"}}
+
+    def _save_manifest(self, table, manifest):
+        # Write-then-rename so readers always see a complete manifest
+        tmp = self._dir(table, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._dir(table, "manifest.json"))
+        self._manifests[table] = manifest
+
+    # --- EXPORT ---
+    def refresh(self, tables=None):
+        """Pulls new rows for each table; returns {table: rows added}."""
+        with self._lock:
+            # Retired last time round: readers have had a whole interval to move to the new manifest
+            retired, self._retired = self._retired, []
+            for table, segment in retired:
+                self._mapped = {k: v for k, v in self._mapped.items() if k[:2] != (table, segment)}
+                shutil.rmtree(self._dir(table, segment), ignore_errors=True)
+            return {table: self._refresh(table) for table in tables or SCHEMA}
+
+    def _refresh(self, table):
+        manifest = json.loads(json.dumps(self.manifest(table)))  # edit a copy, swap on save
+        os.makedirs(self._dir(table), exist_ok=True)
+        done = manifest["rows"]
+        if done and manifest.get("columns") != list(SCHEMA[table]):
+            return self._rebuild(table)  # Segments written for an older SCHEMA lack columns
+        # Re-read our newest row as an anchor: if it moved, start over
+        chunks = self.source.iter_rows(table, self.CHUNK, start=max(done - 1, 0))
+        new = []
+        anchored = not done
+        for chunk in chunks:
+            if not anchored:
+                if _anchor(chunk[0]) != manifest["anchor"]:
+                    return self._rebuild(table)
+                anchored, chunk = True, chunk[1:]
+            new.extend(chunk)
+        if not anchored:
+            return self._rebuild(table)  # The source has fewer rows than we exported
+        if not new:
+            return 0
+
+        name = f"{len(manifest['segments']):06d}-{time.time_ns()}"
+        self._write_segment(table, name, self._encode(table, new, manifest["dictionaries"]))
+        manifest["segments"].append({"name": name, "rows": len(new)})
+        manifest["rows"] += len(new)
+        manifest["anchor"] = _anchor(new[-1])
+        stale = self._merge_small(table, manifest)
+        self._save_manifest(table, manifest)
+        self._retired.extend((table, seg) for seg in stale)
+        return len(new)
+
+    def _rebuild(self, table):
+        # Start from an empty manifest; the old segments are retired, not deleted yet
+        self._retired.extend((table, s["name"]) for s in self.manifest(table)["segments"])
+        self._save_manifest(table, self._empty(table))
+        return self._refresh(table)
+
+    def _encode(self, table, rows, dictionaries):
+        columns = {}
+        for i, (col, kind) in enumerate(SCHEMA[table].items()):
+            values = [r[i] if i < len(r) else "" for r in rows]
+            if kind in ("date", "datetime"):
+                parsed = pd.to_datetime(pd.Series(values, dtype=str), errors="coerce", format="ISO8601")
+                columns[col] = parsed.to_numpy().astype("datetime64[D]" if kind == "date" else "datetime64[s]")
+            elif kind == "float":
+                columns[col] = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(np.float64)
+            elif kind == "category":
+                vocab = dictionaries[col]
+                codes = {v: c for c, v in enumerate(vocab)}
+                out = np.empty(len(values), np.int32)
+                for j, v in enumerate(values):
+                    v = str(v)
+                    if v not in codes:
+                        codes[v] = len(vocab)
+                        vocab.append(v)
+                    out[j] = codes[v]
+                columns[col] = out
+            else:
+                encoded = [str(v).encode("utf-8") for v in values]
+                offsets = np.zeros(len(encoded) + 1, np.int64)
+                np.cumsum([len(b) for b in encoded], out=offsets[1:])
+                columns[col + ".offsets"] = offsets
+                columns[col + ".bytes"] = np.frombuffer(b"".join(encoded), np.uint8)
+        return columns
+
+    def _write_segment(self, table, name, columns):
+        tmp = self._dir(table, name + ".tmp")
+        os.makedirs(tmp, exist_ok=True)
+        for col, array in columns.items():
+            np.save(os.path.join(tmp, col + ".npy"), array)
+        os.replace(tmp, self._dir(table, name))
+
+    def _merge_small(self, table, manifest):
+        """Folds the trailing run of small segments into one; returns the replaced names."""
+        segments = manifest["segments"]
+        small = 0
+        while small < len(segments) and segments[-1 - small]["rows"] < self.SEGMENT_ROWS:
+            small += 1
+        if small <= self.MAX_SMALL_SEGMENTS:
+            return []
+        tail = segments[-small:]
+        merged = {}
+        for col, kind in SCHEMA[table].items():
+            if kind == "text":
+                data = [self._file(table, s["name"], col + ".bytes") for s in tail]
+                offsets, base = [np.zeros(1, np.int64)], 0
+                for s, d in zip(tail, data):
+                    o = self._file(table, s["name"], col + ".offsets")
+                    offsets.append(o[1:] + base)
+                    base += len(d)
+                merged[col + ".offsets"] = np.concatenate(offsets)
+                merged[col + ".bytes"] = np.concatenate(data)
+            else:
+                merged[col] = np.concatenate([self._file(table, s["name"], col) for s in tail])
+        name = f"{len(segments) - small:06d}-{time.time_ns()}"
+        self._write_segment(table, name, merged)
+        manifest["segments"] = segments[:-small] + [{"name": name, "rows": sum(s["rows"] for s in tail)}]
+        return [s["name"] for s in tail]
+
+    # --- READS ---
+    def _file(self, table, segment, name):
+        key = (table, segment, name)
+        array = self._mapped.get(key)
+        if array is None:
+            array = self._mapped[key] = np.load(self._dir(table, segment, name + ".npy"), mmap_mode="r")
+        return array
+
+    def ready(self, table="daily_entries"):
+        return self.manifest(table)["rows"] > 0
+
+    def column(self, table, col, manifest=None):
+        """One column across every segment (decoded to str objects for text columns)."""
+        segments = (manifest or self.manifest(table))["segments"]
+        kind = SCHEMA[table][col]
+        if kind == "text":
+            out = []
+            for s in segments:
+                data = self._file(table, s["name"], col + ".bytes")
+                offsets = self._file(table, s["name"], col + ".offsets")
+                raw = bytes(data)
+                out.extend(raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1))
+            return np.array(out, dtype=object)
+        parts = [self._file(table, s["name"], col) for s in segments]
+        return np.concatenate(parts) if parts else np.zeros(0)
+
+    def metric_history(self, goal_name):
+        """DataFrame(date, value, entries) of every logged value for one goal, in sheet order.
+
+        A compacted summary row is one point for its whole day, with `entries` > 1.
+        """
+        manifest = self.manifest("daily_entries")  # one consistent set of segments for the whole read
+        vocab = manifest["dictionaries"]["goal_name"]
+        if goal_name not in vocab:
+            return pd.DataFrame({"date": pd.Series(dtype="datetime64[s]"), "value": pd.Series(dtype=float),
+                                 "entries": pd.Series(dtype=float)})
+        code = vocab.index(goal_name)
+        dates, values, entries = [], [], []
+        for s in manifest["segments"]:
+            mask = self._file("daily_entries", s["name"], "goal_name") == code
+            mask &= ~np.isnan(self._file("daily_entries", s["name"], "value"))
+            dates.append(self._file("daily_entries", s["name"], "date")[mask])
+            values.append(self._file("daily_entries", s["name"], "value")[mask])
+            entries.append(self._file("daily_entries", s["name"], "entries")[mask])
+        entries = np.concatenate(entries)
+        return pd.DataFrame({"date": np.concatenate(dates).astype("datetime64[s]"),
+                             "value": np.concatenate(values),
+                             "entries": np.where(np.isnan(entries), 1.0, entries)})
+
+    def daily_counts(self, table="daily_entries"):
+        """DataFrame(date, count): entries logged per day (a compacted summary row counts as its `entries`)."""
+        manifest = self.manifest(table)
+        dates = self.column(table, "timestamp" if table == "chat_history" else "date", manifest)
+        dates = dates.astype("datetime64[D]")
+        weights = np.ones(len(dates))
+        if "entries" in SCHEMA[table]:
+            entries = self.column(table, "entries", manifest)
+            weights = np.where(np.isnan(entries), 1.0, entries)
+        valid = ~np.isnat(dates)
+        days, inverse = np.unique(dates[valid], return_inverse=True)
+        counts = np.bincount(inverse, weights=weights[valid], minlength=len(days)).astype(np.int64)
+        return pd.DataFrame({"date": days.astype("datetime64[s]"), "count": counts})
+
+    # --- BACKGROUND ---
+    def start(self):
+        """Refreshes every `interval` seconds on a daemon thread (once per process)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="coach-snapshot", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            time.sleep(self.interval)
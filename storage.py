@@ -0,0 +1,253 @@
+import datetime
+import time
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+
+# Canonical column layout for bulk copies between backends (matches the Sheets tabs)
+TABLES = {
+    "goals": ["name", "target", "unit", "category"],
+    "daily_entries": ["date", "goal_name", "value", "rpe", "entries"],  # entries: set on compacted summaries
+    "food_logs": ["date", "time", "content"],
+    "chat_history": ["timestamp", "sender", "message"],
+    "schedule": ["date", "time_slot", "task", "status"],
+}
+
+# Goals that are readings rather than daily quotas: never summed, the day's last reading counts
+MEASUREMENTS = {"Weight"}
+
+
+def header_columns(header):
+    """Normalized header -> column index ('Goal Name ' -> 'goal_name')."""
+    return {str(h).lower().strip().replace(" ", "_"): i for i, h in enumerate(header)}
+
+
+class SidebarSnapshot:
+    """Everything one render of the sidebar/Commander needs, fetched in one go."""
+
+    def __init__(self, weight_logged, schedule=None, progress=None, chat=None, chat_cursor=2):
+        self.weight_logged = weight_logged
+        self.schedule = schedule or []
+        self.progress = progress or []
+        self.chat = chat            # None unless requested (first Commander load)
+        self.chat_cursor = chat_cursor
+
+
+class CoachStorage(ABC):
+    """What main.py and app.py need from a storage engine.
+
+    database.CoachDB (Google Sheets) and coach_db.SuperCoachDB (SQLite) both
+    implement it. Row ids (schedule rows, chat cursors) follow sheet numbering:
+    the first data row is 2.
+    """
+
+    # --- GOALS ---
+    @abstractmethod
+    def get_goals(self):
+        """[{name, target, unit, category}, ...] in display order."""
+
+    @abstractmethod
+    def add_new_goal(self, name, target, unit, category):
+        """Returns False if a goal with that name already exists."""
+
+    def get_all_goal_names(self):
+        return [g['name'] for g in self.get_goals()]
+
+    def get_goal_synonyms(self):
+        """Keyword -> goal name for the chat parser."""
+        return {str(g['name']).lower(): g['name'] for g in self.get_goals()}
+
+    # --- LOGGING ---
+    @abstractmethod
+    def log_metric(self, name, value, rpe=None):
+        pass
+
+    def update_log(self, goal_name, value):
+        """Sets today's total for a goal by logging the difference."""
+        today = datetime.date.today().isoformat()
+        current = self.get_day_total(today, goal_name)
+        if value != current:
+            self.log_metric(goal_name, value - current)
+
+    @abstractmethod
+    def log_food(self, content):
+        pass
+
+    def log_meal(self, meal_type, menu, ate):
+        self.log_food(f"{meal_type}: {ate} (menu: {menu})" if menu else f"{meal_type}: {ate}")
+
+    @abstractmethod
+    def log_chat(self, sender, message):
+        pass
+
+    # --- READS ---
+    @abstractmethod
+    def get_day_total(self, date, goal_name):
+        pass
+
+    @abstractmethod
+    def get_progress(self):
+        """[(name, target, unit, total_today, last_rpe), ...]"""
+
+    def get_todays_progress(self):
+        """[(category, name, target, unit, total_today), ...], as app.py renders it."""
+        categories = {g['name']: g.get('category') or "General" for g in self.get_goals()}
+        rows = [(categories.get(name, "General"), name, target, unit, total)
+                for name, target, unit, total, _ in self.get_progress()]
+        rows.sort(key=lambda r: r[1])
+        rows.sort(key=lambda r: r[0], reverse=True)
+        return rows
+
+    @abstractmethod
+    def is_weight_logged_today(self):
+        pass
+
+    @abstractmethod
+    def get_metric_history(self, goal_name):
+        pass
+
+    @abstractmethod
+    def get_consistency_data(self):
+        pass
+
+    @abstractmethod
+    def get_raw_history(self):
+        pass
+
+    def get_logged_goal_names(self):
+        """Sorted goal names that have at least one log row (including goals since deleted)."""
+        return sorted({str(r['goal_name']) for r in self.get_raw_history() if r['goal_name'] != ""})
+
+    def get_history_page(self, goals=None, start=None, end=None, page=0, page_size=50):
+        """(rows, total): page `page` (0-based) of raw log rows, newest first.
+
+        Filters by a set of goal names and an inclusive ISO date range; `total`
+        counts every matching row. Backends with an index should override this.
+        """
+        rows = [r for r in self.get_raw_history()
+                if (not goals or r['goal_name'] in goals)
+                and (not start or str(r['date']) >= str(start))
+                and (not end or str(r['date']) <= str(end))]
+        rows.reverse()  # Newest row first within a day
+        rows.sort(key=lambda r: str(r['date']), reverse=True)
+        first = page * page_size
+        return rows[first:first + page_size], len(rows)
+
+    @abstractmethod
+    def get_todays_food(self):
+        """[(meal_type, what_i_ate, menu_description), ...]"""
+
+    @abstractmethod
+    def get_chat_page(self, before_row=None, limit=20):
+        """([(sender, msg), ...], cursor); a cursor of 2 means nothing older."""
+
+    def get_chat_history(self, limit=20):
+        return self.get_chat_page(limit=limit)[0]
+
+    # --- SCHEDULE ---
+    @abstractmethod
+    def create_schedule(self, tasks):
+        pass
+
+    @abstractmethod
+    def get_full_schedule(self):
+        pass
+
+    @abstractmethod
+    def mark_mission_done(self, row_id):
+        pass
+
+    # --- WRITE LISTENERS ---
+    _listeners = ()
+
+    def add_listener(self, callback):
+        """`callback(goal_name, value, date)` runs after every metric logged through this object."""
+        self._listeners = (*self._listeners, callback)
+
+    def _notify(self, goal_name, value, date):
+        for callback in self._listeners:
+            callback(goal_name, value, date)
+
+    # --- OPTIONAL HOOKS (no-ops unless the backend has something to offer) ---
+    def batch(self):
+        return nullcontext()
+
+    def invalidate(self, name=None):
+        pass
+
+    def queue_depth(self):
+        return 0
+
+    def sync_error(self):
+        return None
+
+    def dead_letters(self):
+        """Queued writes given up on, as (seq, kind, worksheet, values, attempts, error, created_at)."""
+        return []
+
+    def load_sidebar(self, commander=True, include_chat=False, chat_limit=10):
+        snap = SidebarSnapshot(self.is_weight_logged_today())
+        if commander:
+            snap.schedule = self.get_full_schedule()
+            snap.progress = self.get_progress()
+        if include_chat:
+            snap.chat, snap.chat_cursor = self.get_chat_page(limit=chat_limit)
+        return snap
+
+    # --- BULK COPY ---
+    @abstractmethod
+    def count_rows(self, table):
+        pass
+
+    @abstractmethod
+    def iter_rows(self, table, chunk_size=500, start=0):
+        """Yields lists of rows laid out as TABLES[table], oldest first, skipping the first `start`."""
+
+    @abstractmethod
+    def bulk_append(self, table, rows):
+        """Appends one chunk of TABLES[table]-shaped rows in as few calls as possible.
+
+        Cached reads of `table` may be stale until target.invalidate() (copy_storage does it).
+        """
+
+
+def copy_storage(source, target, tables=None, chunk_size=500, progress=None):
+    """Streams every row of `tables` from one backend to another in chunks.
+
+    `progress(table, copied, total, seconds)` is called after each chunk.
+    Returns {table: rows_copied}.
+    """
+    copied = {}
+    try:
+        for table in tables or TABLES:
+            total = source.count_rows(table)
+            done = 0
+            started = time.monotonic()
+            for chunk in source.iter_rows(table, chunk_size):
+                target.bulk_append(table, chunk)
+                done += len(chunk)
+                if progress:
+                    progress(table, done, total, time.monotonic() - started)
+            copied[table] = done
+    finally:
+        target.invalidate()  # bulk_append leaves caches stale; drop them once, not per chunk
+    return copied
+
+
+def configured_backend(default):
+    """The `storage_backend` secret ("sheets" or "sqlite"), or `default` if unset."""
+    import streamlit as st
+    try:
+        return st.secrets.get("storage_backend", default)
+    except FileNotFoundError:
+        return default
+
+
+def open_storage(backend, **kwargs):
+    """Builds a backend by name: "sheets" -> CoachDB, "sqlite" -> SuperCoachDB."""
+    if backend == "sheets":
+        from database import CoachDB
+        return CoachDB(**kwargs)
+    if backend == "sqlite":
+        from coach_db import SuperCoachDB
+        return SuperCoachDB(**kwargs)
+    raise ValueError(f"Unknown storage backend: {backend!r}")
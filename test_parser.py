@@ -0,0 +1,59 @@
+import pytest
+
+from parser import SmartParser
+
+parser = SmartParser()
+
+
+@pytest.mark.parametrize("text, goal, value", [
+    ("20 pullups", "Pullups", 20),
+    ("did 20 pullups today", "Pullups", 20),
+    ("i just did 4 sets of dips", "Dips", 4),
+    ("pushups: 30", "Pushups", 30),
+    ("weight 72.5", "Weight", 72.5),
+    ("72.5kg", "Weight", 72.5),
+    ("plyo done", "Plyometrics", 1),
+])
+def test_plain_logs_take_the_fast_path(text, goal, value):
+    result = parser.parse(text)
+    assert result.confidence == 1.0
+    assert result.commands == [{"action": "log_metric", "goal": goal, "value": value}]
+
+
+def test_every_clause_counts():
+    result = parser.parse("15 pullups and 20 dips, ate 2 eggs and toast")
+    assert result.confidence == 1.0
+    assert [c.get("goal") for c in result.commands] == ["Pullups", "Dips", None]
+    assert result.commands[-1]["item"] == "2 eggs and toast"
+
+
+@pytest.mark.parametrize("text", [
+    # Intent and future
+    "I want to do 20 pullups tomorrow",
+    "i will do 30 pushups later",
+    "my goal is 50 dips by june",
+    "target weight is 70",
+    # Negation
+    "dont log 20 pullups",
+    "i didn't do 20 pullups",
+    # Another day
+    "yesterday I did 20 pullups",
+    "did 20 pullups on 12/03",
+    # Words the pattern didn't consume
+    "20 pullups were too hard for me yesterday",
+    "20 pullups felt way too hard",
+    "lost 2 kg this month",
+    "had a meeting with 3 apps people",
+])
+def test_doubtful_logs_go_to_the_llm(text):
+    assert parser.parse(text).confidence < 1.0
+
+
+def test_one_doubtful_clause_lowers_confidence():
+    result = parser.parse("20 pullups and i will do 30 dips later")
+    assert 0.0 < result.confidence < 1.0
+    assert len(result.commands) == 2
+
+
+def test_questions_have_no_confidence():
+    assert parser.parse("should I do 20 pullups?").confidence == 0.0
@@ -0,0 +1,168 @@
+import contextvars
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Per-rerun call tracing. main.py opens a Trace at the top of every rerun; spans
+# recorded anywhere below it (CoachDB's worksheet calls and cache lookups, Gemini
+# generations) land in that trace, including ones made from CoachDB's read pool.
+# Spans from background threads have no trace and only go to the export file.
+
+_current = contextvars.ContextVar("coach_trace", default=None)
+_export = None  # (path, format, lock) once export_to() is called
+
+# Rows sampled to estimate the size of a large response without serializing all of it
+SIZE_SAMPLE = 20
+
+
+class Span:
+    """One timed call: a Sheets request, a cache lookup or a Gemini generation."""
+
+    def __init__(self, kind, name, worksheet=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind            # "sheets" | "cache" | "gemini"
+        self.name = name
+        self.worksheet = worksheet
+        self.rows = None
+        self.bytes = None
+        self.cache = None           # "hit" | "miss" | "tail" for cache spans
+        self.retries = 0
+        self.error = None
+        self.attrs = {}
+        self.thread = threading.current_thread().name
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def measure(self, result):
+        """Records the row count and approximate JSON size of a list-of-rows response."""
+        if not isinstance(result, list):
+            return
+        self.rows = len(result)
+        sample = result[:SIZE_SAMPLE]
+        if sample:
+            self.bytes = int(len(json.dumps(sample, default=str)) / len(sample) * len(result))
+
+    def to_dict(self, trace=None):
+        return {
+            "trace": trace.id if trace else None,
+            "span": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "worksheet": self.worksheet,
+            "start_ms": round((self.start - trace.start) * 1000, 1) if trace else None,
+            "ms": round(self.ms, 1),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "cache": self.cache,
+            "retries": self.retries,
+            "error": self.error,
+            "thread": self.thread,
+            **self.attrs,
+        }
+
+
+class Trace:
+    """Every span recorded during one rerun of a script."""
+
+    def __init__(self, label):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.clock = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        self.start = time.perf_counter()
+        self.end = None
+        self.spans = []
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def ms(self):
+        end = self.end or max([s.end or s.start for s in self.spans] + [self.start])
+        return (end - self.start) * 1000
+
+    def rows(self):
+        """Spans as dicts, in start order (start_ms is relative to the rerun)."""
+        return [s.to_dict(self) for s in sorted(self.spans, key=lambda s: s.start)]
+
+
+def begin(label):
+    """Starts a new trace for the calling thread (and any context copied from it)."""
+    trace = Trace(label)
+    _current.set(trace)
+    return trace
+
+
+def current():
+    return _current.get()
+
+
+def propagate(fn):
+    """Wraps fn so it runs inside the caller's trace, e.g. before handing it to a thread pool."""
+    ctx = contextvars.copy_context()  # one copy per call: a context can't run on two threads at once
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+@contextmanager
+def span(kind, name, worksheet=None, **attrs):
+    """Times the block as one span of the current trace; exceptions are recorded and re-raised."""
+    s = Span(kind, name, worksheet)
+    s.attrs.update(attrs)
+    try:
+        yield s
+    except Exception as e:
+        s.error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        s.end = time.perf_counter()
+        trace = _current.get()
+        if trace is not None:
+            trace.spans.append(s)
+        if _export is not None:
+            _write(s, trace)
+
+
+# --- EXPORT ---
+def export_to(path, fmt="jsonl"):
+    """Appends every finished span to `path`: "jsonl" (flat dicts) or "otel" (OTLP-style JSON spans)."""
+    global _export
+    if fmt not in ("jsonl", "otel"):
+        raise ValueError(f"Unknown trace format: {fmt!r}")
+    _export = (os.path.abspath(path), fmt, threading.Lock())
+
+
+def _otel(s, trace):
+    end = s.wall_start + ((s.end or s.start) - s.start)
+    attrs = {k: v for k, v in s.to_dict(trace).items()
+             if k not in ("trace", "span", "name", "start_ms", "ms") and v is not None}
+    return {
+        "traceId": trace.id if trace else uuid.uuid4().hex,
+        "spanId": s.id,
+        "name": f"{s.kind}.{s.name}",
+        "kind": "SPAN_KIND_CLIENT",
+        "startTimeUnixNano": int(s.wall_start * 1e9),
+        "endTimeUnixNano": int(end * 1e9),
+        "attributes": [{"key": f"coach.{k}", "value": {"intValue" if isinstance(v, int) else "stringValue":
+                                                         v if isinstance(v, int) else str(v)}}
+                       for k, v in attrs.items()],
+        "status": {"code": "STATUS_CODE_ERROR", "message": s.error} if s.error else {"code": "STATUS_CODE_OK"},
+    }
+
+
+def _write(s, trace):
+    path, fmt, lock = _export
+    record = _otel(s, trace) if fmt == "otel" else {"time": s.wall_start, "label": trace.label if trace else None,
+                                                    **s.to_dict(trace)}
+    try:
+        with lock, open(path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError:
+        pass  # Tracing must never break the app